@@ -0,0 +1,84 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# pi-e-ink-daily: daily agenda on a wHat e-ink display
+#
+# Simple json-based cache-file with atomic updates
+#
+# Author: Bernhard Bablok
+# License: GPL3
+#
+# Website: https://github.com/bablokb/pi-e-ink-daily
+#
+# ----------------------------------------------------------------------------
+
+import os, json, tempfile, fcntl
+
+class CacheFile(object):
+
+  # --- constructor   --------------------------------------------------------
+
+  def __init__(self,path):
+    """ save path of cache-file """
+    self.path = path
+
+  # --- load content of cache-file   -----------------------------------------
+
+  def load(self):
+    """ load content, return empty dict for missing or broken files """
+
+    try:
+      with open(self.path,"r") as f:
+        data = json.load(f)
+      if isinstance(data,dict):
+        return data
+    except Exception:
+      pass
+    return {}
+
+  # --- save content to cache-file   -----------------------------------------
+
+  def save(self,data):
+    """ save content atomically (write temp-file and rename) """
+
+    cache_dir = os.path.dirname(self.path)
+    try:
+      if cache_dir:
+        os.makedirs(cache_dir,exist_ok=True)
+      fd, tmp = tempfile.mkstemp(dir=cache_dir or None,prefix=".cache-")
+      with os.fdopen(fd,"w") as f:
+        json.dump(data,f)
+      os.replace(tmp,self.path)
+    except Exception:
+      # a cache is an optimization: never fail because of it
+      try:
+        os.unlink(tmp)
+      except Exception:
+        pass
+
+  # --- update content of cache-file   ---------------------------------------
+
+  def update(self,func):
+    """ replace content with func(content). The update is serialized
+        with other processes using a lock-file, so concurrent updates
+        of different entries are merged """
+
+    cache_dir = os.path.dirname(self.path)
+    try:
+      if cache_dir:
+        os.makedirs(cache_dir,exist_ok=True)
+      with open(self.path+".lock","a") as lock:
+        fcntl.flock(lock,fcntl.LOCK_EX)
+        self.save(func(self.load()))
+    except Exception:
+      pass
+
+  # --- remove cache-file   --------------------------------------------------
+
+  def clear(self):
+    """ remove cache-file """
+
+    try:
+      os.unlink(self.path)
+    except Exception:
+      pass
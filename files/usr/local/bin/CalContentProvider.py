@@ -12,109 +12,555 @@
 #
 # ----------------------------------------------------------------------------
 
-import caldav
-import tzlocal
 import datetime
+import heapq
+import json
+import math
+import time
+import threading
 #import traceback
-from operator import itemgetter
-
-from PIL import ImageFont
+from collections        import deque
+from concurrent.futures import Future, TimeoutError
 
 from ContentProvider import ContentProvider
+from CacheFile       import CacheFile
+from CalEvent        import CalEvent
+from CalSync         import CalSync, SyncTokenError
+
+# heavy modules are imported on first use
+caldav        = None
+vobject       = None
+tzlocal       = None
+CalRecurrence = None
+
+# --- import modules for caldav-access   -------------------------------------
+
+def import_caldav():
+  """ import modules needed for caldav-access (global) """
+
+  global caldav, vobject, tzlocal, CalRecurrence
+  if not caldav:
+    import caldav, vobject, tzlocal
+    from CalRecurrence import CalRecurrence
+
+ONE_MINUTE = datetime.timedelta(minutes=1)
 
 class CalContentProvider(ContentProvider):
 
+  URL_CACHE   = "caldav-urls.json"
+  EVENT_STORE = "caldav-events.json"
+  MASTER_STORE = "caldav-masters.json"
+
+  SCHEMA = {
+    "TIME_SIZE":   int,
+    "cal_threads": int,
+    "cal_timeout": (int,float),
+    "cal_expand":  str,
+    "cal_days":    int,
+    "SEP_FORMAT":  str,
+    "MORE_TEXT":   str,
+    "cals":        list
+    }
+
+  CAL_KEYS = ["dav_url","dav_user","dav_pw","cal_name","cal_color"]
+
   # --- constructor   --------------------------------------------------------
   
   def __init__(self,screen):
     super(CalContentProvider,self).__init__(screen)
+    self._url_lock   = threading.Lock()
+    self._agenda     = None
+    self._store_lock = threading.Lock()
+    self._run        = 0               # results of older runs are ignored
+    self._worker     = threading.local()
+    self._fetched    = False
+    self._recurrences = {}
+
+  # --- validate settings   --------------------------------------------------
+
+  @classmethod
+  def validate_options(cls,opts):
+    """ check settings of all calendars """
+
+    from ConfigCompiler import ConfigCompiler
+    errors = []
+    if opts.get("cal_expand","server") not in ["server","local"]:
+      errors.append("cal_expand: must be server or local")
+    if opts.get("cal_days",0) < 0:
+      errors.append("cal_days: must not be negative")
+    for i,cal_info in enumerate(opts.get("cals",[])):
+      if not isinstance(cal_info,dict):
+        errors.append("cals[%d]: not a json-object" % i)
+        continue
+      for key in CalContentProvider.CAL_KEYS:
+        if not isinstance(cal_info.get(key,None),str):
+          errors.append("cals[%d]: %s missing" % (i,key))
+      if cal_info.get("cal_color","black") not in ConfigCompiler.COLORS:
+        errors.append("cals[%d]: unknown color %r" % (i,cal_info["cal_color"]))
+    return errors
+
+  # --- fonts (loaded on first use)   ---------------------------------------
+
+  @property
+  def _time_font(self):
+    return self.screen.fonts.get(self.opts.TIME_FONT,self.opts.TIME_SIZE)
 
-  # --- return maximal number of possible entries   ------------------------
+  # --- read agendas from caldav-servers   ------------------------------------
 
-  def get_max_entries(self):
-    """ return entries - must be called after dray_day """
+  def _get_agenda(self):
+    """ read agenda for all configured calendars (concurrently). Returns
+        a list of events (sorted by time, see CalEvent.to_list()) for
+        every calendar """
+
+    cals    = self.opts.cals
+    threads = max(1,min(self.opts.cal_threads,len(cals)))
+    timeout = self.opts.cal_timeout
+
+    # upper limit for the start of a calendar: waiting for the network
+    # and the full per-calendar timeout for every batch of threads
+    limit = (time.monotonic() + self.opts.probe_deadline +
+             timeout*math.ceil(len(cals)/threads))
+
+    import_caldav()                      # before threads are started
+    self._tz = tzlocal.get_localzone()   # resolved once per run
+    self._load_url_cache()
+    self._load_event_store()
+    ready   = [[threading.Event(),None] for cal_info in cals]
+    futures = self._start_workers(threads,
+                  [(self._get_agenda_for_cal,(self._run,index,cal_info,
+                                              ready[index]))
+                                      for index,cal_info in enumerate(cals)])
+    streams = []
+    failed  = 0
+    for future,state in zip(futures,ready):
+      try:
+        # the timeout of a calendar starts when its host is available
+        if state[0].wait(max(0,limit-time.monotonic())):
+          deadline = state[1] + timeout
+        else:
+          deadline = limit
+        events = future.result(timeout=max(0,deadline-time.monotonic()))
+        streams.append([event.to_list() for event in sorted(events)])
+      except TimeoutError:
+        future.cancel()
+        failed += 1
+      except:
+        #traceback.print_exc()
+        failed += 1
+
+    # don't wait for hanging connections: abandoned workers must not
+    # change the caches any more (see _is_current())
+    with self._url_lock, self._store_lock:
+      self._run += 1
+      url_cache = dict(self._url_cache)
+      store     = dict(self._store)
+    self._save_url_cache(url_cache)
+    self._save_event_store(store)
+
+    # only give up if no calendar could be read
+    if cals and failed == len(cals):
+      raise RuntimeError("could not read any calendar")
+    return streams
+
+  # --- run calendar-workers   -----------------------------------------------
+
+  def _start_workers(self,threads,tasks):
+    """ run tasks (list of (function,args)) on the given number of
+        daemon-threads, return list of futures. Unlike the threads of a
+        ThreadPoolExecutor, abandoned (hanging) workers don't delay the
+        exit of the program. """
+
+    futures = [Future() for task in tasks]
+    queue   = deque(zip(futures,tasks))
+    def worker():
+      while True:
+        try:
+          future, (func,args) = queue.popleft()
+        except IndexError:
+          return
+        if not future.set_running_or_notify_cancel():
+          continue                                      # cancelled
+        try:
+          future.set_result(func(*args))
+        except BaseException as ex:
+          future.set_exception(ex)
+
+    for i in range(threads):
+      threading.Thread(target=worker,daemon=True).start()
+    return futures
+
+  # --- check if the calling worker is part of the current run   ------------
+
+  def _is_current(self):
+    """ check if the calling worker-thread belongs to the current run.
+        Must be called with the lock of the updated cache held. """
+
+    return getattr(self._worker,"run",None) == self._run
+
+  # --- key of calendar within url-cache   -----------------------------------
+
+  def _get_cache_key(self,cal_info):
+    """ return key for the url-cache """
+
+    return "|".join([cal_info["dav_url"],cal_info["dav_user"],
+                     cal_info["cal_name"]])
+
+  # --- load url-cache   ------------------------------------------------------
+
+  def _load_url_cache(self):
+    """ load cache with urls of calendar-collections """
+
+    self._url_file  = CacheFile(self.screen.get_cache_path(
+                                            CalContentProvider.URL_CACHE))
+    cache = self._url_file.load()
+
+    # only use entries of configured calendars
+    self._url_keys  = set(self._get_cache_key(cal_info)
+                                               for cal_info in self.opts.cals)
+    self._url_cache = {k: v for k,v in cache.items() if k in self._url_keys}
+    self._url_dirty = False
+
+  # --- save url-cache   ------------------------------------------------------
+
+  def _save_url_cache(self,url_cache):
+    """ save (copy of the) cache with urls of calendar-collections if
+        changed. The entries of other providers (calendars) are kept """
+
+    if not self._url_dirty:
+      return
+
+    def merge(cache):
+      for key in self._url_keys:
+        if key in url_cache:
+          cache[key] = url_cache[key]
+        else:
+          cache.pop(key,None)                  # invalidated
+      return cache
 
-    return int((self.opts.HEIGHT-
-                self.opts.HEIGHT_S-self.screen._y_off)/
-                                                    self.opts.HEIGHT_E)
+    self._url_file.update(merge)
+    self._url_dirty = False
 
-  # --- create fonts   -----------------------------------------------------
+  # --- update url-cache   ----------------------------------------------------
 
-  def create_fonts(self):
-    """ create fonts """
+  def _set_cached_url(self,key,url):
+    """ update (url is not None) or invalidate entry of url-cache """
 
-    self._time_font   = ImageFont.truetype(self.opts.TIME_FONT,
-                                          self.opts.TIME_SIZE)
+    with self._url_lock:
+      if not self._is_current():
+        return
+      if url:
+        self._url_cache[key] = url
+      else:
+        self._url_cache.pop(key,None)
+      self._url_dirty = True
 
-  # --- read agendas from caldav-servers   ------------------------------------
+  # --- check for missing calendar-collection   ------------------------------
 
-  def _get_agenda(self):
-    """ read agenda for all configured calendars """
+  def _is_gone(self,ex):
+    """ check if the exception signals a missing collection (404/410) """
+
+    if isinstance(ex,caldav.lib.error.NotFoundError):
+      return True
+    return "404" in str(ex) or "410" in str(ex)
 
-    entries = []
-    for cal_info in self.opts.cals:
-      self._get_agenda_for_cal(cal_info,entries)
-    entries.sort(key=itemgetter(0))
-    return entries
+  # --- find calendar by name   -----------------------------------------------
+
+  def _find_calendar(self,client,cal_info):
+    """ find calendar-collection using principal discovery """
+
+    calendars = client.principal().calendars()
+    cal = next(c for c in calendars if c.name == cal_info["cal_name"])
+    self._set_cached_url(self._get_cache_key(cal_info),str(cal.url))
+    return cal
+
+  # --- return calendar, use cached calendar-url if available   -------------
+
+  def _get_calendar(self,client,cal_info):
+    """ return calendar-object """
+
+    with self._url_lock:
+      url = self._url_cache.get(self._get_cache_key(cal_info),None)
+    if url:
+      return client.calendar(url=url)
+    else:
+      return self._find_calendar(client,cal_info)
+
+  # --- load event-store   ----------------------------------------------------
+
+  def _load_event_store(self):
+    """ load local store with the events of the last run """
+
+    if self.opts.cal_expand == "local":
+      name = CalContentProvider.MASTER_STORE
+    else:
+      name = CalContentProvider.EVENT_STORE
+    self._store_file = CacheFile(self.screen.get_cache_path(name))
+    store = self._store_file.load()
+    self._store_keys = set(self._get_cache_key(cal_info)
+                                               for cal_info in self.opts.cals)
+    self._store = {k: v for k,v in store.items() if k in self._store_keys}
+
+  # --- save event-store   ----------------------------------------------------
+
+  def _save_event_store(self,store):
+    """ save (copy of the) local store with events. The entries of other
+        providers (calendars) are kept unless they were not updated within
+        data_max_age """
+
+    limit = time.time() - self.opts.data_max_age
+    def merge(old):
+      old = {k: v for k,v in old.items()
+                    if k not in self._store_keys and v.get("time",0) > limit}
+      old.update(store)
+      return old
+
+    self._store_file.update(merge)
+
+  # --- query state of calendar   --------------------------------------------
+
+  def _get_state(self,client,cal_info):
+    """ return tuple (calendar,CalSync,ctag,sync-token) """
+
+    key = self._get_cache_key(cal_info)
+    cal = self._get_calendar(client,cal_info)
+    try:
+      sync = CalSync(client,cal.url)
+      ctag, token = sync.get_state()
+    except Exception as ex:
+      if not self._is_gone(ex):
+        raise
+      # calendar moved or was deleted: invalidate and rediscover
+      self._set_cached_url(key,None)
+      cal  = self._find_calendar(client,cal_info)
+      sync = CalSync(client,cal.url)
+      ctag, token = sync.get_state()
+    return (cal,sync,ctag,token)
+
+  # --- synchronize events of calendar with event-store   --------------------
+
+  def _sync_events(self,client,cal_info,start,end):
+    """ return dict href -> [ical-data] for the given time-range.
+
+        Events are only downloaded if the state of the calendar (ctag
+        or sync-token) changed. If possible, only changed resources
+        are downloaded.
+    """
+
+    key = self._get_cache_key(cal_info)
+    cal, sync, ctag, token = self._get_state(client,cal_info)
+
+    with self._store_lock:
+      stored = self._store.get(key,None)
+    if stored and (stored["day"] != start.date().isoformat() or
+                   stored.get("end",None) != end.date().isoformat() or
+                   stored["url"] != str(cal.url)):
+      stored = None                   # new day, new range or new calendar
+
+    events = None
+    if stored and (ctag or token) and (
+        stored["ctag"] == ctag and stored["token"] == token):
+      # nothing changed
+      events = stored["events"]
+    elif stored and token and stored["token"]:
+      # only download changed resources
+      try:
+        changed, removed, token = sync.sync_collection(stored["token"])
+        events = dict(stored["events"])
+        for href in changed + removed:
+          events.pop(href,None)
+        events.update(sync.multiget(changed,
+                  self._tz.localize(start).astimezone(datetime.timezone.utc),
+                  self._tz.localize(end).astimezone(datetime.timezone.utc)))
+      except SyncTokenError:
+        events = None
+
+    if events is None:
+      # full download
+      events = {}
+      for cal_event in cal.date_search(start=start,end=end,expand=True):
+        events.setdefault(sync.get_href(cal_event.url),[]).append(
+                                                            cal_event.data)
+
+    with self._store_lock:
+      if self._is_current():
+        self._store[key] = {
+          'day':    start.date().isoformat(),
+          'end':    end.date().isoformat(),
+          'url':    str(cal.url),
+          'ctag':   ctag,
+          'token':  token,
+          'time':   time.time(),
+          'events': events
+          }
+    return events
+
+  # --- synchronize compiled events of calendar with the store   -------------
+
+  def _sync_objects(self,client,cal_info):
+    """ return dict href -> {etag,events} with the compiled (unexpanded)
+        events of all objects of the calendar.
+
+        If the state of the calendar changed, the etags of all objects
+        are queried and only objects with a new etag are downloaded
+        and compiled.
+    """
+
+    key = self._get_cache_key(cal_info)
+    cal, sync, ctag, token = self._get_state(client,cal_info)
+
+    with self._store_lock:
+      stored = self._store.get(key,None)
+    if stored and stored["url"] != str(cal.url):
+      stored = None                              # new calendar
+
+    if stored and (ctag or token) and (
+        stored["ctag"] == ctag and stored["token"] == token):
+      # nothing changed
+      objects = stored["objects"]
+    else:
+      old     = stored["objects"] if stored else {}
+      etags   = sync.get_etags()
+      changed = [href for href,etag in etags.items()
+                              if old.get(href,{}).get("etag",None) != etag]
+      objects = {href: old[href] for href in etags if href not in changed}
+      data    = sync.multiget(changed)
+      with self.screen.timer.phase("parse"):
+        for href in changed:
+          events = []
+          for ical in data.get(href,[]):
+            try:
+              events.extend(CalRecurrence.compile(ical))
+            except Exception:
+              pass                   # keep etag: don't download it again
+          objects[href] = {'etag': etags[href], 'events': events}
+
+    with self._store_lock:
+      if self._is_current():
+        self._store[key] = {
+          'url':     str(cal.url),
+          'ctag':    ctag,
+          'token':   token,
+          'time':    time.time(),
+          'objects': objects
+          }
+    return objects
 
   # --- read agenda from caldav-server   --------------------------------------
 
-  def _get_agenda_for_cal(self,cal_info,entries):
-    """ read agenda from caldav-server """
+  def _get_agenda_for_cal(self,run,index,cal_info,ready):
+    """ read agenda (today and the next cal_days days) from caldav-server,
+        return list of CalEvent (run: number of the current run,
+        ready: [event,time] set when the host is available) """
 
-    start_of_day = datetime.datetime.combine(datetime.date.today(),
-                                         datetime.time.min)
-    end_of_day   = datetime.datetime.combine(datetime.date.today(),
-                                         datetime.time.max)
-    now          = tzlocal.get_localzone().localize(datetime.datetime.now())
+    self._worker.run = run
+    try:
+      self.screen.wait_host(cal_info["dav_url"])       # network available
+    finally:
+      ready[1] = time.monotonic()                      # timeout starts now
+      ready[0].set()
+
+    today        = self.screen.now().date()
+    last_day     = today + datetime.timedelta(days=self.opts.cal_days)
+    start_of_day = datetime.datetime.combine(today,datetime.time.min)
+    end_of_day   = datetime.datetime.combine(last_day,datetime.time.max)
+    start        = self._tz.localize(start_of_day)
+    end          = self._tz.localize(end_of_day)
+    now          = self._tz.localize(self.screen.now())
 
     client = caldav.DAVClient(url=cal_info["dav_url"],
                                 username=cal_info["dav_user"],
-                                password=cal_info["dav_pw"])
-
-    # get calendar by name
-    calendars = client.principal().calendars()
-    cal = next(c for c in calendars if c.name == cal_info["cal_name"])
+                                password=cal_info["dav_pw"],
+                                timeout=self.opts.cal_timeout)
+    client.session = self.screen.get_http_session()    # shared connections
 
     # extract relevant data
-    cal_events = cal.date_search(start=start_of_day,end=end_of_day,expand=True)
-    agenda_list = []
-    for cal_event in cal_events:
-      item = {}
-      if hasattr(cal_event.instance, 'vtimezone'):
-        tzinfo = cal_event.instance.vtimezone.gettzinfo()
+    if self.opts.cal_expand == "local":
+      objects = self._sync_objects(client,cal_info)
+      with self.screen.timer.phase("parse"):
+        items = self._expand_events(self._get_cache_key(cal_info),objects,
+                                    start,end)
+        return self._get_events(items,index,cal_info["cal_color"],
+                                start,end,now)
+
+    events = self._sync_events(client,cal_info,start_of_day,end_of_day)
+    with self.screen.timer.phase("parse"):
+      items = self._parse_events(events,start_of_day)
+      return self._get_events(items,index,cal_info["cal_color"],
+                              start,end,now)
+
+  # --- parse events   --------------------------------------------------------
+
+  def _parse_events(self,events,start_of_day):
+    """ parse ical-data, yield items (dtstart,dtend,all_day,summary,location) """
+
+    for ical in [data for ical_list in events.values() for data in ical_list]:
+      instance = vobject.readOne(ical)
+      if hasattr(instance, 'vtimezone'):
+        tzinfo = instance.vtimezone.gettzinfo()
       else:
-        tzinfo = tzlocal.get_localzone()
-      components = cal_event.instance.components()
-      for component in components:
+        tzinfo = self._tz
+      for component in instance.components():
         if component.name != 'VEVENT':
           continue
-        item['dtstart'] = self._get_timeattr(
-          component,'dtstart',start_of_day,tzinfo)
+        all_day = (hasattr(component,'dtstart') and
+                   not isinstance(component.dtstart.value,datetime.datetime))
+        dtstart = self._get_timeattr(component,'dtstart',start_of_day,tzinfo)
         if hasattr(component,'duration'):
-          duration = getattr(component,'duration').value
-          item['dtend'] = item['dtstart'] + duration
+          dtend = dtstart + component.duration.value
         else:
-          item['dtend']   = self._get_timeattr(
-            component,'dtend',end_of_day,tzinfo)
-        if item['dtend'] < now:
-          # ignore old events
-          continue
-        if item['dtend'].day != item['dtstart'].day:
-          item['dtend'] = tzlocal.get_localzone().localize(end_of_day)
-
-        for attr in ('summary', 'location'):
-          if hasattr(component,attr):
-            item[attr] = getattr(component,attr).value
-          else:
-            item[attr] = ""
-        agenda_list.append(item)
-
-    for item in agenda_list:
-      entries.append(("%s-%s" % (item['dtstart'].astimezone().strftime("%H:%M"),
-                                 item['dtend'].astimezone().strftime("%H:%M")),
-                      (item['summary'],item['location']),
-                      self.screen._cmap[cal_info["cal_color"]]))
+          dtend = self._get_timeattr(component,'dtend',
+                    datetime.datetime.combine(dtstart.date(),datetime.time.max),
+                    tzinfo)
+        yield (dtstart,dtend,all_day,
+               component.summary.value if hasattr(component,'summary') else "",
+               component.location.value if hasattr(component,'location') else "")
+
+  # --- expand compiled events   ----------------------------------------------
+
+  def _expand_events(self,key,objects,start,end):
+    """ expand compiled events, yield items (see _parse_events()) """
+
+    # recurrence-sets are kept as long as the etag does not change
+    cache = self._recurrences.get(key,{})
+    for href,obj in objects.items():
+      if href not in cache or cache[href][0] != obj['etag']:
+        cache[href] = (obj['etag'],CalRecurrence(obj['events']))
+      yield from cache[href][1].expand(start,end)
+    self._recurrences[key] = {href: cache[href] for href in objects}
+
+  # --- create events   -------------------------------------------------------
+
+  def _get_events(self,items,index,cal_color,start,end,now):
+    """ return list of CalEvent for items. Events spanning several days
+        create one CalEvent per day. """
+
+    tz     = self._tz
+    events = []
+    for dtstart,dtend,all_day,summary,location in items:
+      if dtend < now:
+        # ignore old events
+        continue
+      if dtend <= start or dtstart > end:
+        # the store might contain events of other days
+        continue
+
+      day   = max(dtstart,start).astimezone(tz).date()
+      first = True
+      while True:
+        day_start = tz.localize(datetime.datetime.combine(day,datetime.time.min))
+        day_end   = tz.localize(datetime.datetime.combine(day,datetime.time.max))
+        if day_start > end or (not first and day_start >= dtend):
+          break
+        e_start = max(dtstart,day_start)
+        e_end   = min(dtend,day_end)
+        if e_end >= now:
+          events.append(CalEvent(e_start,e_end,
+                                 all_day or (e_start == day_start and
+                                             e_end >= day_end - ONE_MINUTE),
+                                 index,cal_color,summary,location))
+        day  += datetime.timedelta(days=1)
+        first = False
+    return events
 
   # --- extract time attribute   ----------------------------------------------
 
@@ -128,72 +574,193 @@ class CalContentProvider(ContentProvider):
     else:
       dt = default
     if not dt.tzinfo:
-      dt = tzinfo.localize(dt)
+      if hasattr(tzinfo,'localize'):
+        dt = tzinfo.localize(dt)
+      else:
+        dt = dt.replace(tzinfo=tzinfo)            # not a pytz-timezone
     return dt
 
   # --- agenda entry   ------------------------------------------------------
 
-  def _draw_entry(self,e_time,e_text,e_color):
+  def _draw_entry(self,event):
     """ draw a single agenda entry """
 
+    e_color = self.screen._cmap[event.color]
+    fill    = self.screen._bg_map[e_color]
+
     # background
-    background = [(0,self.screen._y_off+1),
-                    (self.opts.WIDTH,
-                                    self.screen._y_off+self.opts.HEIGHT_E-1)]
+    x0, _, width, _ = self.region
+    background = [(x0,self._y_off+1),
+                    (x0+width,self._y_off+self.opts.HEIGHT_E-1)]
     self.canvas.rectangle(background,fill=e_color)
   
     # time-value
-    tm      = e_time.split('-')
-    tm_size = [0,0]
-    tm_size[0] = self.canvas.textsize(tm[0],self._time_font,spacing=0)
-    tm_size[1] = self.canvas.textsize(tm[1],self._time_font,spacing=0)
-    if e_time != "00:00-23:59":
+    tm      = [event.start.strftime("%H:%M"),event.end.strftime("%H:%M")]
+    tm_size = [self.screen.measure.size(self._time_font,t) for t in tm]
+    if not event.all_day:
       # only print time for none full-day events
-      self.canvas.text((self.opts.MARGINS[2],self.screen._y_off+2),
-                        tm[0],font=self._time_font,
-                        fill=self.screen._bg_map[e_color])
-      self.canvas.text((self.opts.MARGINS[2],self.screen._y_off+4+tm_size[0][1]),
-                        tm[1],font=self._time_font,
-                        fill=self.screen._bg_map[e_color])
+      self.canvas.text((x0+self.opts.MARGINS[2],self._y_off+2),
+                        tm[0],font=self._time_font,fill=fill)
+      self.canvas.text((x0+self.opts.MARGINS[2],self._y_off+4+tm_size[0][1]),
+                        tm[1],font=self._time_font,fill=fill)
 
     # text (2 lines)
-    txt_x_off = self.opts.MARGINS[2] + max(tm_size[0][0],tm_size[1][0]) + 4
-    txt_y_off = self.screen._y_off + 2
-    text_size = self.canvas.textsize(e_text[0],
-                                      self.screen._text_font,spacing=0)
-    self.canvas.text((txt_x_off,txt_y_off),e_text[0],
-                      font=self.screen._text_font,
-                      fill=self.screen._bg_map[e_color])
+    txt_x_off = (x0 + self.opts.MARGINS[2] +
+                 max(tm_size[0][0],tm_size[1][0]) + 4)
+    txt_y_off = self._y_off + 2
+    text_size = self.screen.measure.size(self.screen._text_font,event.summary)
+    self.canvas.text((txt_x_off,txt_y_off),event.summary,
+                      font=self.screen._text_font,fill=fill)
 
     txt_y_off += text_size[1]
-    self.canvas.text((txt_x_off,txt_y_off),
-                      e_text[1],font=self.screen._text_font,
-                      fill=self.screen._bg_map[e_color])
+    self.canvas.text((txt_x_off,txt_y_off),event.location,
+                      font=self.screen._text_font,fill=fill)
 
     # ending line
-    self.screen._y_off += self.opts.HEIGHT_E
-    self.screen._draw_hline(self.screen._y_off)
+    self._y_off += self.opts.HEIGHT_E
+    self.screen._draw_hline(self._y_off,x0,x0+width)
 
-  # --- draw content on screen   ---------------------------------------------
+  # --- single line of text (day-separator, overflow-indicator)   -----------
 
-  def draw_content(self):
-    """ draw agenda-items """
+  def _draw_line(self,text):
+    """ draw a line of text with height HEIGHT_S """
+
+    x0, _, width, _ = self.region
+    self.canvas.text((x0+self.opts.MARGINS[2],self._y_off),text,
+                     font=self.screen._status_font,fill=self.opts.TEXT_COLOR)
+    self._y_off += self.opts.HEIGHT_S
+    self.screen._draw_hline(self._y_off,x0,x0+width)
+
+  # --- time of next change of content   -----------------------------------
+
+  def get_next_change(self):
+    """ return next start or end of an event (of the complete agenda, not
+        only of the visible entries) """
+
+    if not self._agenda:
+      return None
+    now   = self.screen.now().timestamp()
+    times = [t for stream in self._agenda['events'] for entry in stream
+                                                for t in entry[:2] if t > now]
+    if not times:
+      return None
+    return datetime.datetime.fromtimestamp(min(times))     # events are local
+
+  # --- fetch data   --------------------------------------------------------
+
+  def fetch(self):
+    """ fetch agenda """
+
+    today = self.screen.now().date().isoformat()
+    days  = self.opts.cal_days
+    def fetch():
+      return {'day': today, 'days': days, 'events': self._get_agenda()}
 
     try:
-      entries = self._get_agenda()
+      self._agenda = self.fetch_data(fetch,
+                             lambda data: data.get('day') == today and
+                                          data.get('days') == days and
+                                          'events' in data)
     except:
       #traceback.print_exc()
-      self.screen.rc = self.screen.RC_FAIL
+      self._agenda = None
+    self._fetched = True
 
-    if self.screen.rc:
-      self.screen.draw_image(self.screen.NO_CONNECT)
-    elif len(entries):
-      count = 0
-      for entry in entries:
-        self._draw_entry(*entry)
-        count += count
-        if count > self.get_max_entries():
-          break
-    else:
-      self.screen.draw_image(self.screen.NO_EVENTS)
+  # --- hosts needed by the provider   ---------------------------------------
+
+  def get_urls(self):
+    return [cal_info["dav_url"] for cal_info in self.opts.cals]
+
+  # --- shared data   --------------------------------------------------------
+
+  def get_data_key(self):
+    """ key: days, calendars and their colors (part of the entries) """
+
+    return json.dumps(["CalContentProvider",
+                       self.screen.now().date().isoformat(),
+                       self.opts.cal_days,
+                       [[self._get_cache_key(cal_info),cal_info["cal_color"]]
+                                              for cal_info in self.opts.cals]])
+
+  def get_data(self):
+    return self._agenda
 
+  def set_data(self,data):
+    self._agenda  = data
+    self._fetched = True
+
+  # --- draw content on screen   ---------------------------------------------
+
+  def draw_content(self):
+    """ draw agenda-items """
+
+    if not self._fetched:
+      self.fetch()
+    self._fetched = False
+
+    if not self._agenda:
+      self.screen.rc = self.screen.RC_FAIL
+      self.screen.draw_image(self.screen.NO_CONNECT,self.region)
+      return
+
+    # merge the sorted events of all calendars and stop when the
+    # region is full (a stale agenda might contain events which already ended)
+    now     = self.screen.now().timestamp()
+    streams = self._agenda['events']
+    entries = (e for e in heapq.merge(*streams) if e[1] > now)
+    visible, more = self._get_visible(entries,self._count_current(streams,now))
+
+    if not visible and not more:
+      self.screen.draw_image(self.screen.NO_EVENTS,self.region)
+      return
+    for event,separator in visible:
+      if separator:
+        self._draw_line(event.start.strftime(self.opts.SEP_FORMAT))
+      self._draw_entry(event)
+    if more:
+      self._draw_line(self.opts.MORE_TEXT.format(more))
+
+  # --- number of current entries   ------------------------------------------
+
+  def _count_current(self,streams,now):
+    """ return number of entries which did not end before now. The lists
+        are sorted by start, so only the entries which already started
+        are checked. """
+
+    ended = 0
+    for stream in streams:
+      for entry in stream:
+        if entry[0] > now:
+          break
+        if entry[1] <= now:
+          ended += 1
+    return sum(len(stream) for stream in streams) - ended
+
+  # --- select visible entries   ----------------------------------------------
+
+  def _get_visible(self,entries,total):
+    """ return tuple (list of (CalEvent,separator),number of hidden
+        entries). Only entries until the region is full are consumed and
+        converted to CalEvent (total: number of all entries). """
+
+    height  = self.region[3]
+    used    = 0
+    last    = self.screen.now().date()          # today has no separator
+    visible = []
+    for entry in entries:
+      event = CalEvent.from_list(entry)
+      day   = event.start.date()
+      separator = day != last
+      need = self.opts.HEIGHT_E + (self.opts.HEIGHT_S if separator else 0)
+      if used + need > height:
+        # make room for the overflow-indicator
+        more = total - len(visible)
+        while visible and used + self.opts.HEIGHT_S > height:
+          _, separator = visible.pop()
+          used -= self.opts.HEIGHT_E + (self.opts.HEIGHT_S if separator else 0)
+          more += 1
+        return (visible,more)
+      visible.append((event,separator))
+      used += need
+      last  = day
+    return (visible,0)
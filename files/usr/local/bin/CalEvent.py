@@ -0,0 +1,53 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# pi-e-ink-daily: daily agenda on a wHat e-ink display
+#
+# A single entry of the agenda (one day of an event).
+#
+# Author: Bernhard Bablok
+# License: GPL3
+#
+# Website: https://github.com/bablokb/pi-e-ink-daily
+#
+# ----------------------------------------------------------------------------
+
+import datetime
+
+class CalEvent(object):
+
+  __slots__ = ("start","end","all_day","cal","color","summary","location")
+
+  # --- constructor   --------------------------------------------------------
+
+  def __init__(self,start,end,all_day,cal,color,summary,location):
+    """ start/end: timezone-aware datetimes, cal: index of the calendar """
+
+    self.start    = start
+    self.end      = end
+    self.all_day  = all_day
+    self.cal      = cal
+    self.color    = color
+    self.summary  = summary
+    self.location = location
+
+  # --- order by time   ------------------------------------------------------
+
+  def __lt__(self,other):
+    return (self.start,self.end) < (other.start,other.end)
+
+  # --- conversion to/from json   --------------------------------------------
+
+  def to_list(self):
+    """ return json-serializable list (times as timestamps) """
+
+    return [self.start.timestamp(),self.end.timestamp(),self.all_day,
+            self.cal,self.color,self.summary,self.location]
+
+  @classmethod
+  def from_list(cls,data):
+    """ create event from list (see to_list()), times are local """
+
+    return cls(datetime.datetime.fromtimestamp(data[0]).astimezone(),
+               datetime.datetime.fromtimestamp(data[1]).astimezone(),
+               *data[2:])
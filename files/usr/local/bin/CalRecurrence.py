@@ -0,0 +1,236 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# pi-e-ink-daily: daily agenda on a wHat e-ink display
+#
+# Local expansion of (recurring) events. An ical-object is compiled once
+# into json-serializable records (wall-clock start, timezone, duration,
+# RRULE/RDATE/EXDATE, overridden instances as separate records), which are
+# expanded for any time-range without parsing the ical-data again.
+#
+# Author: Bernhard Bablok
+# License: GPL3
+#
+# Website: https://github.com/bablokb/pi-e-ink-daily
+#
+# ----------------------------------------------------------------------------
+
+import re, datetime
+
+import vobject
+from dateutil import rrule, tz
+
+UNTIL = re.compile(r"UNTIL=([0-9]{8})(T[0-9]{6}Z?)?")
+WALL  = "%Y%m%dT%H%M%S"
+LOCAL = tz.tzlocal()
+
+class CalRecurrence(object):
+
+  # --- constructor   --------------------------------------------------------
+
+  def __init__(self,records):
+    """ records: compiled events (see compile()) """
+
+    self._records = records
+    self._sets    = {}                 # index of record -> rruleset
+
+  # --- compile ical-object   ------------------------------------------------
+
+  @staticmethod
+  def compile(ical):
+    """ return list of compiled events (json-serializable) of an ical-object """
+
+    instance = vobject.readOne(ical)
+    if hasattr(instance,'vtimezone'):
+      default_tz = instance.vtimezone.gettzinfo()
+    else:
+      default_tz = LOCAL
+
+    masters   = {}
+    overrides = []
+    for component in instance.components():
+      if component.name != 'VEVENT' or not hasattr(component,'dtstart'):
+        continue
+      if hasattr(component,'recurrence_id'):
+        overrides.append(component)
+      else:
+        uid = component.uid.value if hasattr(component,'uid') else None
+        masters[uid] = CalRecurrence._compile_event(component,default_tz)
+
+    # an overridden instance replaces the instance of the master
+    records = [record for record,_ in masters.values()]
+    for component in overrides:
+      uid    = component.uid.value if hasattr(component,'uid') else None
+      master = masters.get(uid,None)
+      if master:
+        record, ds = master
+        record["exdate"].append(CalRecurrence._get_wall(
+          component.recurrence_id.value,ds).strftime(WALL))
+      status = component.status.value if hasattr(component,'status') else ""
+      if status.upper() != "CANCELLED":
+        records.append(CalRecurrence._compile_event(component,default_tz)[0])
+    return records
+
+  # --- compile a single event   ---------------------------------------------
+
+  @staticmethod
+  def _compile_event(component,default_tz):
+    """ return tuple (record,dtstart) of a VEVENT """
+
+    value   = component.dtstart.value
+    all_day = not isinstance(value,datetime.datetime)
+    if all_day:
+      ds = datetime.datetime(value.year,value.month,value.day,
+                             tzinfo=LOCAL)
+    elif value.tzinfo:
+      ds = value
+    else:
+      ds = value.replace(tzinfo=default_tz)
+
+    # vobject moves the TZID-parameter when converting the value
+    tzid   = None
+    params = component.dtstart.params
+    for name in ['TZID','X-VOBJ-ORIGINAL-TZID']:
+      if not all_day and params.get(name,None):
+        tzid = params[name][0]
+        tzid = tzid[0] if isinstance(tzid,list) else tzid
+        break
+    offset = ds.utcoffset().total_seconds() if not all_day and (
+                                 value.tzinfo or tzid) else None
+
+    if hasattr(component,'duration'):
+      duration = component.duration.value.total_seconds()
+    elif hasattr(component,'dtend'):
+      duration = (CalRecurrence._get_wall(component.dtend.value,ds) -
+                  ds.replace(tzinfo=None)).total_seconds()
+    elif all_day:
+      duration = 86400
+    else:
+      duration = None                                 # until end of day
+
+    record = {
+      "start":    ds.replace(tzinfo=None).strftime(WALL),
+      "all_day":  all_day,
+      "tzid":     tzid,
+      "offset":   offset,
+      "duration": duration,
+      "rrule":    [],
+      "rdate":    [],
+      "exdate":   [],
+      "summary":  component.summary.value if hasattr(component,
+                                                     'summary') else "",
+      "location": component.location.value if hasattr(component,
+                                                      'location') else ""
+      }
+    if hasattr(component,'recurrence_id'):
+      return (record,ds)                     # single instance of a series
+
+    for line in getattr(component,'rrule_list',[]):
+      record["rrule"].append(UNTIL.sub(
+        lambda m: "UNTIL=" + CalRecurrence._get_until(m,ds),line.value))
+    for line in getattr(component,'rdate_list',[]):
+      record["rdate"].extend(CalRecurrence._get_wall(v,ds).strftime(WALL)
+               for v in line.value if not isinstance(v,tuple))   # no periods
+    for line in getattr(component,'exdate_list',[]):
+      record["exdate"].extend(CalRecurrence._get_wall(v,ds).strftime(WALL)
+                                                         for v in line.value)
+    return (record,ds)
+
+  # --- convert time-value to wall-clock of dtstart   ------------------------
+
+  @staticmethod
+  def _get_wall(value,ds):
+    """ return naive wall-clock time within the timezone of ds """
+
+    if not isinstance(value,datetime.datetime):
+      return datetime.datetime.combine(value,ds.time())
+    if value.tzinfo:
+      return value.astimezone(ds.tzinfo).replace(tzinfo=None)
+    return value
+
+  # --- convert UNTIL of a RRULE to wall-clock of dtstart   ------------------
+
+  @staticmethod
+  def _get_until(match,ds):
+    """ return UNTIL as naive wall-clock time (expansion is naive) """
+
+    if not match.group(2):
+      until = datetime.datetime.strptime(match.group(1),"%Y%m%d")
+      return datetime.datetime.combine(until.date(),
+                                       datetime.time(23,59,59)).strftime(WALL)
+    until = datetime.datetime.strptime(match.group(1)+match.group(2)[:7],
+                                       WALL)
+    if match.group(2).endswith("Z"):
+      until = until.replace(tzinfo=tz.UTC).astimezone(
+                                            ds.tzinfo).replace(tzinfo=None)
+    return until.strftime(WALL)
+
+  # --- timezone of a record   -----------------------------------------------
+
+  def _get_tz(self,record):
+    """ return timezone of the record (fixed offset if tzid is unknown) """
+
+    if record["tzid"]:
+      tzinfo = tz.gettz(record["tzid"])
+      if tzinfo:
+        return tzinfo
+    if record["offset"] is not None:
+      return datetime.timezone(datetime.timedelta(seconds=record["offset"]))
+    return LOCAL
+
+  # --- recurrence-set of a record   -----------------------------------------
+
+  def _get_set(self,index,record,dtstart):
+    """ return rruleset of record (created on first use) """
+
+    if index not in self._sets:
+      rset = rrule.rruleset()
+      rset.rdate(dtstart)                     # dtstart is always an instance
+      for rule in record["rrule"]:
+        rset.rrule(rrule.rrulestr(rule,dtstart=dtstart))
+      for value in record["rdate"]:
+        rset.rdate(datetime.datetime.strptime(value,WALL))
+      for value in record["exdate"]:
+        rset.exdate(datetime.datetime.strptime(value,WALL))
+      self._sets[index] = rset
+    return self._sets[index]
+
+  # --- expand events   ------------------------------------------------------
+
+  def expand(self,start,end):
+    """ return list of (dtstart,dtend,all_day,summary,location) of all
+        instances overlapping the time-range (start/end: timezone-aware) """
+
+    result = []
+    for index,record in enumerate(self._records):
+      tzinfo  = self._get_tz(record)
+      dtstart = datetime.datetime.strptime(record["start"],WALL)
+      if record["duration"] is None:
+        duration = None
+        slack    = datetime.timedelta(days=1)
+      else:
+        duration = datetime.timedelta(seconds=record["duration"])
+        slack    = duration + datetime.timedelta(days=1)
+
+      if record["rrule"] or record["rdate"]:
+        # expansion uses the naive wall-clock, slack covers DST-changes
+        low  = start.astimezone(tzinfo).replace(tzinfo=None) - slack
+        high = end.astimezone(tzinfo).replace(tzinfo=None) + slack
+        instances = self._get_set(index,record,dtstart).between(low,high,
+                                                                inc=True)
+      else:
+        instances = [dtstart]
+
+      for instance in instances:
+        if duration is None:
+          inst_end = datetime.datetime.combine(instance.date(),
+                                               datetime.time.max)
+        else:
+          inst_end = instance + duration
+        inst_start = instance.replace(tzinfo=tzinfo)
+        inst_end   = inst_end.replace(tzinfo=tzinfo)
+        if inst_end <= start or inst_start > end:
+          continue
+        result.append((inst_start,inst_end,record.get("all_day",False),
+                       record["summary"],record["location"]))
+    return result
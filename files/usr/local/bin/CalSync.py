@@ -0,0 +1,191 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# pi-e-ink-daily: daily agenda on a wHat e-ink display
+#
+# Incremental synchronization of a calendar-collection (ctag, RFC 6578
+# sync-collection, etags and calendar-multiget). Used by CalContentProvider.
+#
+# Author: Bernhard Bablok
+# License: GPL3
+#
+# Website: https://github.com/bablokb/pi-e-ink-daily
+#
+# ----------------------------------------------------------------------------
+
+import xml.etree.ElementTree as ET
+from urllib.parse import urljoin, urlparse, unquote
+
+# --- exception for invalid sync-tokens   ------------------------------------
+
+class SyncTokenError(Exception):
+  pass
+
+# --- synchronization with a single calendar-collection   --------------------
+
+class CalSync(object):
+
+  NS = {
+    'D': 'DAV:',
+    'C': 'urn:ietf:params:xml:ns:caldav',
+    'CS': 'http://calendarserver.org/ns/'
+    }
+
+  PROPFIND_STATE = """<?xml version="1.0" encoding="utf-8"?>
+<D:propfind xmlns:D="DAV:" xmlns:CS="http://calendarserver.org/ns/">
+  <D:prop><CS:getctag/><D:sync-token/></D:prop>
+</D:propfind>"""
+
+  PROPFIND_ETAGS = """<?xml version="1.0" encoding="utf-8"?>
+<D:propfind xmlns:D="DAV:">
+  <D:prop><D:getetag/></D:prop>
+</D:propfind>"""
+
+  SYNC_COLLECTION = """<?xml version="1.0" encoding="utf-8"?>
+<D:sync-collection xmlns:D="DAV:">
+  <D:sync-token>{0}</D:sync-token>
+  <D:sync-level>1</D:sync-level>
+  <D:prop><D:getetag/></D:prop>
+</D:sync-collection>"""
+
+  MULTIGET = """<?xml version="1.0" encoding="utf-8"?>
+<C:calendar-multiget xmlns:D="DAV:" xmlns:C="urn:ietf:params:xml:ns:caldav">
+  <D:prop>
+    <D:getetag/>
+    <C:calendar-data>{0}</C:calendar-data>
+  </D:prop>
+{1}
+</C:calendar-multiget>"""
+
+  EXPAND = '<C:expand start="{0}" end="{1}"/>'
+
+  # --- constructor   --------------------------------------------------------
+
+  def __init__(self,client,url):
+    """ save client (caldav.DAVClient) and url of calendar-collection """
+
+    self._client = client
+    self._url    = str(url)
+
+  # --- check status of response   -------------------------------------------
+
+  def _check(self,response):
+    """ raise an exception for errors (message contains status) """
+
+    if response.status >= 300:
+      raise IOError("DAV-request failed with status %d" % response.status)
+
+  # --- parse response   -----------------------------------------------------
+
+  def _parse(self,response):
+    """ parse multistatus-response """
+
+    raw = response.raw
+    if isinstance(raw,str):
+      raw = raw.encode("utf-8")
+    return ET.fromstring(raw)
+
+  # --- normalize href   -----------------------------------------------------
+
+  def _href(self,href):
+    """ return path-part of href (servers differ in absolute/relative) """
+
+    return unquote(urlparse(urljoin(self._url,href.strip())).path)
+
+  # --- query ctag and sync-token of collection   ----------------------------
+
+  def get_state(self):
+    """ return tuple (ctag,sync-token), missing values are None """
+
+    response = self._client.propfind(self._url,CalSync.PROPFIND_STATE,depth=0)
+    self._check(response)
+    tree = self._parse(response)
+
+    ctag  = tree.find('.//CS:getctag',CalSync.NS)
+    token = tree.find('.//D:sync-token',CalSync.NS)
+    return (ctag.text if ctag is not None and ctag.text else None,
+            token.text if token is not None and token.text else None)
+
+  # --- query etags of all resources   ---------------------------------------
+
+  def get_etags(self):
+    """ return dict href -> etag of all resources of the collection """
+
+    response = self._client.propfind(self._url,CalSync.PROPFIND_ETAGS,depth=1)
+    self._check(response)
+    tree = self._parse(response)
+
+    etags = {}
+    for resp in tree.findall('D:response',CalSync.NS):
+      href = self._href(resp.find('D:href',CalSync.NS).text)
+      etag = resp.find('.//D:getetag',CalSync.NS)
+      if href != self._href("") and etag is not None and etag.text:
+        etags[href] = etag.text
+    return etags
+
+  # --- query changes since given sync-token   -------------------------------
+
+  def sync_collection(self,token):
+    """ return tuple (changed hrefs, removed hrefs, new sync-token) """
+
+    from caldav.lib.error import AuthorizationError
+    try:
+      response = self._client.report(self._url,
+                                     CalSync.SYNC_COLLECTION.format(token),
+                                     depth=1)
+    except AuthorizationError:
+      # the client raises an exception for status 403
+      raise SyncTokenError()
+    if response.status in [403,409]:
+      # RFC 6578: valid-sync-token precondition failed
+      raise SyncTokenError()
+    self._check(response)
+    tree = self._parse(response)
+
+    changed = []
+    removed = []
+    for resp in tree.findall('D:response',CalSync.NS):
+      href = self._href(resp.find('D:href',CalSync.NS).text)
+      status = resp.find('D:status',CalSync.NS)
+      if status is not None and (" 404" in status.text or
+                                 " 410" in status.text):
+        removed.append(href)
+      elif href != self._href(""):
+        changed.append(href)
+
+    new_token = tree.find('D:sync-token',CalSync.NS)
+    if new_token is None or not new_token.text:
+      raise SyncTokenError()
+    return (changed,removed,new_token.text)
+
+  # --- fetch (expanded) events for given hrefs   ----------------------------
+
+  def multiget(self,hrefs,start=None,end=None):
+    """ return dict href -> [ical-data] for the given time-range (UTC).
+        Without time-range, the unexpanded objects are returned. """
+
+    if not hrefs:
+      return {}
+    fmt    = "%Y%m%dT%H%M%SZ"
+    body   = "\n".join(["  <D:href>%s</D:href>" % h for h in hrefs])
+    expand = CalSync.EXPAND.format(start.strftime(fmt),
+                                   end.strftime(fmt)) if start else ""
+    query  = CalSync.MULTIGET.format(expand,body)
+    response = self._client.report(self._url,query,depth=1)
+    self._check(response)
+    tree = self._parse(response)
+
+    result = {}
+    for resp in tree.findall('D:response',CalSync.NS):
+      href = self._href(resp.find('D:href',CalSync.NS).text)
+      data = resp.find('.//C:calendar-data',CalSync.NS)
+      if data is not None and data.text:
+        result.setdefault(href,[]).append(data.text)
+    return result
+
+  # --- normalize href of an object   ----------------------------------------
+
+  def get_href(self,url):
+    """ return normalized href of an url """
+
+    return self._href(str(url))
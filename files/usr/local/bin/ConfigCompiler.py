@@ -0,0 +1,261 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# pi-e-ink-daily: daily agenda on a wHat e-ink display
+#
+# Compile the configuration: merge defaults, defaults of the content-providers
+# and the user-configuration, validate the result and resolve font-paths.
+# The result is cached as a snapshot keyed by the modification-times of
+# all source-files.
+#
+# Author: Bernhard Bablok
+# License: GPL3
+#
+# Website: https://github.com/bablokb/pi-e-ink-daily
+#
+# ----------------------------------------------------------------------------
+
+import os, json, hashlib
+
+from CacheFile import CacheFile
+
+# --- exception for invalid configurations   ---------------------------------
+
+class ConfigError(Exception):
+  pass
+
+# --- compiler   -------------------------------------------------------------
+
+class ConfigCompiler(object):
+
+  VERSION   = 1                          # change to invalidate snapshots
+  FONT_DIRS = ["/usr/share/fonts","/usr/local/share/fonts"]
+  COLORS    = ["white","black","gray","red","yellow","green","blue","orange"]
+
+  NUMBER = (int,float)
+  FLAG   = (int,bool)
+
+  # global settings: name -> allowed types (None: optional)
+  SCHEMA = {
+    "auto_shutdown":        FLAG,
+    "no_shutdown_on_error": FLAG,
+    "no_server_connection": str,
+    "no_events":            str,
+    "cache_dir":            str,
+    "data_fresh":           NUMBER,
+    "data_max_age":         NUMBER,
+    "skip_unchanged":       FLAG,
+    "cache_static":         FLAG,
+    "image_dither":         FLAG,
+    "http_timeout":         list,
+    "http_pool_size":       int,
+    "http_tls_resume":      FLAG,
+    "probe_deadline":       NUMBER,
+    "daemon_interval":      NUMBER,
+    "daemon_delay":         NUMBER,
+    "rtc_wakealarm":        str,
+    "rtc_interval":         NUMBER,
+    "rtc_delay":            NUMBER,
+    "run_log":              str,
+    "run_log_size":         int,
+    "run_log_backups":      int,
+    "content_provider":     str,
+    "layout":               (list,type(None)),
+    "WIDTH":                int,
+    "HEIGHT":               int,
+    "HEIGHT_E":             int,
+    "HEIGHT_S":             int,
+    "MARGINS":              list,
+    "TITLE":                str,
+    "TITLE_SIZE":           int,
+    "DAY_SIZE":             int,
+    "TEXT_SIZE":            int,
+    "STATUS_SIZE":          int,
+    "STALE_TEXT":           str,
+    "BAT_GPIO":             int,
+    "BAT_OK_VALUE":         int,
+    "BAT_OK_TEXT":          str,
+    "BAT_LOW_TEXT":         str
+    }
+
+  # --- constructor   --------------------------------------------------------
+
+  def __init__(self,defaults,config_file,provider_defaults,snapshot_dir=None):
+    """ defaults/config_file: global files, provider_defaults: pattern
+        for the defaults of a provider ({} is replaced by the class-name) """
+
+    self._defaults          = defaults
+    self._config_file       = config_file
+    self._provider_defaults = provider_defaults
+    self._snapshot_dir      = snapshot_dir
+
+  # --- compile configuration   ----------------------------------------------
+
+  def compile(self):
+    """ return compiled configuration (dict), raise ConfigError """
+
+    snapshot = self._get_snapshot_file()
+    if snapshot:
+      data = snapshot.load()
+      if (data.get("version",None) == ConfigCompiler.VERSION and
+          data["sources"] == self._get_state([s[0] for s in data["sources"]])):
+        return data["opts"]
+
+    opts, sources = self._merge()
+    self._validate(opts)
+
+    if snapshot:
+      snapshot.save({"version": ConfigCompiler.VERSION,
+                     "sources": self._get_state(sources),
+                     "opts":    opts})
+    return opts
+
+  # --- merge all files   ----------------------------------------------------
+
+  def _merge(self):
+    """ merge defaults, provider-defaults and user-configuration (every file
+        is parsed once), return (opts,list of source-files) """
+
+    defaults = self._load(self._defaults)
+    user     = self._load(self._config_file)
+    merged   = dict(defaults,**user)
+
+    sources = [os.path.abspath(__file__),self._defaults,self._config_file]
+    opts    = dict(defaults)
+    for name in self._get_provider_names(merged):
+      path = self._provider_defaults.format(name)
+      sources.append(path)
+      opts.update(self._load(path))
+    opts.update(user)
+    return (opts,sources)
+
+  # --- load a single file   -------------------------------------------------
+
+  def _load(self,path):
+    """ load json-file (missing files are empty) """
+
+    if not os.path.exists(path):
+      return {}
+    try:
+      with open(path,"r") as f:
+        data = json.load(f)
+    except ValueError as e:
+      raise ConfigError("%s: %s" % (path,e))
+    if not isinstance(data,dict):
+      raise ConfigError("%s: not a json-object" % path)
+    return data
+
+  # --- names of configured providers   --------------------------------------
+
+  def _get_provider_names(self,opts):
+    """ return class-names of all providers (layout or content_provider) """
+
+    layout = opts.get("layout",None) or [
+                                   {"provider": opts.get("content_provider")}]
+    names = []
+    for entry in layout:
+      name = entry.get("provider",None) if isinstance(entry,dict) else None
+      if not isinstance(name,str):
+        raise ConfigError("layout: every entry needs a provider")
+      if name not in names:
+        names.append(name)
+    return names
+
+  # --- state of source-files   ----------------------------------------------
+
+  def _get_state(self,sources):
+    """ return list [path,mtime,size] of all source-files """
+
+    state = []
+    for path in sources:
+      try:
+        stat = os.stat(path)
+        state.append([path,stat.st_mtime_ns,stat.st_size])
+      except OSError:
+        state.append([path,None,None])
+    return state
+
+  # --- snapshot-file   ------------------------------------------------------
+
+  def _get_snapshot_file(self):
+    """ return CacheFile of the snapshot (depends on the config-file) """
+
+    if not self._snapshot_dir:
+      return None
+    key = hashlib.sha1(os.path.abspath(self._config_file).encode("utf-8"))
+    return CacheFile(os.path.join(self._snapshot_dir,
+                                  "config-%s.json" % key.hexdigest()[:12]))
+
+  # --- validate configuration   ---------------------------------------------
+
+  def _validate(self,opts):
+    """ validate configuration and resolve font-paths, raise ConfigError
+        with all errors """
+
+    errors = []
+    self._check(opts,ConfigCompiler.SCHEMA,errors)
+
+    layout = opts.get("layout",None) or [
+                                   {"provider": opts.get("content_provider")}]
+    for i,entry in enumerate(layout):
+      try:
+        klass = getattr(__import__(entry["provider"]),entry["provider"])
+      except (ImportError,AttributeError):
+        errors.append("layout[%d]: unknown provider %s" % (i,entry["provider"]))
+        continue
+      region = entry.get("region",[0,0,100,100])
+      if (not isinstance(region,list) or len(region) != 4 or
+          not all(isinstance(v,ConfigCompiler.NUMBER) for v in region)):
+        errors.append("layout[%d]: region must be [x,y,width,height]" % i)
+      p_opts = dict(opts,**entry.get("options",{}))
+      self._check(p_opts,klass.SCHEMA,errors)
+      errors.extend(klass.validate_options(p_opts))
+      if "options" in entry:
+        self._resolve(entry["options"],errors)
+
+    self._resolve(opts,errors)
+    if errors:
+      raise ConfigError("invalid configuration:\n  " +
+                        "\n  ".join(sorted(set(errors))))
+
+  # --- check types   --------------------------------------------------------
+
+  def _check(self,opts,schema,errors):
+    """ check opts against schema """
+
+    for key,types in schema.items():
+      if key not in opts:
+        if not (isinstance(types,tuple) and type(None) in types):
+          errors.append("%s: missing" % key)
+      elif not isinstance(opts[key],types):
+        errors.append("%s: invalid value %r" % (key,opts[key]))
+
+  # --- check colors and resolve fonts   -------------------------------------
+
+  def _resolve(self,opts,errors):
+    """ check color-names and resolve font-paths (in place) """
+
+    for key,value in opts.items():
+      if "_COLOR" in key and value not in ConfigCompiler.COLORS:
+        errors.append("%s: unknown color %r" % (key,value))
+      elif key.endswith("_FONT"):
+        path = self._find_font(value)
+        if path:
+          opts[key] = path
+        else:
+          errors.append("%s: font %r not found" % (key,value))
+
+  # --- find font   ----------------------------------------------------------
+
+  def _find_font(self,name):
+    """ return absolute path of font or None """
+
+    if not isinstance(name,str):
+      return None
+    if os.path.isabs(name):
+      return name if os.path.exists(name) else None
+    for font_dir in ConfigCompiler.FONT_DIRS:
+      for root,_,files in os.walk(font_dir):
+        if name in files:
+          return os.path.join(root,name)
+    return None
@@ -12,11 +12,17 @@
 #
 # ----------------------------------------------------------------------------
 
-import os, json
+import os, time, glob, hashlib
+
+from CacheFile import CacheFile
 
 class ContentProvider(object):
 
   CONFIG_FILE_DEFAULT = "/etc/pi-e-ink-daily.{}.defaults.json"
+  LAST_DATA           = "{}.last.json"
+
+  # settings of the provider: name -> allowed types (see ConfigCompiler)
+  SCHEMA = {}
 
   # --- constructor   --------------------------------------------------------
   
@@ -24,35 +30,163 @@ class ContentProvider(object):
     """ save screen object """
     self.screen = screen
 
-  # --- read default settings for content-provider   -------------------------
+  # --- validate settings   --------------------------------------------------
 
-  def read_settings(self,opts):
-    """ read settings """
+  @classmethod
+  def validate_options(cls,opts):
+    """ return list of errors (beyond SCHEMA) of the settings (dict) """
 
-    config_file = ContentProvider.CONFIG_FILE_DEFAULT.format(
-                                                      self.__class__.__name__)
-    if os.path.exists(config_file):
-      with open(config_file,"r") as f:
-        opts.update(json.load(f))
+    return []
 
   # --- set canvas-property   ------------------------------------------------
 
   def set_canvas(self,canvas):
     self.canvas = canvas
 
+  # --- set region of canvas   ----------------------------------------------
+
+  def set_region(self,region):
+    """ set region (x,y,width,height) of the canvas used by the provider """
+
+    self.region = region
+    self._y_off = region[1]
+
   # --- set opts-property   --------------------------------------------------
 
   def set_options(self,opts):
     self.opts = opts
 
+  # --- file of the last good dataset   -------------------------------------
+
+  def _get_last_path(self,key):
+    """ return path of the last good dataset of the source of the data """
+
+    name = self.__class__.__name__
+    if key is not None:
+      name += "-" + hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+    return self.screen.get_cache_path(ContentProvider.LAST_DATA.format(name))
+
+  # --- load last good dataset   --------------------------------------------
+
+  def load_data(self):
+    """ return tuple (data,timestamp) of last good dataset or (None,None) """
+
+    key  = self.get_data_key()
+    last = CacheFile(self._get_last_path(key)).load()
+    if "data" in last and "time" in last and last.get("key",None) == key:
+      return (last["data"],last["time"])
+    return (None,None)
+
+  # --- save last good dataset   ---------------------------------------------
+
+  def save_data(self,data):
+    """ save good dataset (must be json-serializable) with timestamp and
+        key of the source. Datasets of other keys older than data_max_age
+        are removed. """
+
+    key  = self.get_data_key()
+    path = self._get_last_path(key)
+    CacheFile(path).save({"time": time.time(), "key": key, "data": data})
+
+    pattern = self.screen.get_cache_path(
+      ContentProvider.LAST_DATA.format(self.__class__.__name__+"-*"))
+    limit   = time.time() - self.opts.data_max_age
+    for name in glob.glob(pattern):
+      try:
+        if name != path and os.path.getmtime(name) < limit:
+          os.remove(name)
+      except:
+        pass
+
+  # --- fetch data, fall back to last good dataset   -------------------------
+
+  def fetch_data(self,fetch,is_valid=None):
+    """ return data from fetch() or from the last good dataset.
+
+        The last dataset is used without calling fetch() if it is younger
+        than data_fresh, and if fetch() fails if it is younger than
+        data_max_age. Stale data is reported to the screen.
+    """
+
+    last, last_time = self.load_data()
+    if last is not None and is_valid and not is_valid(last):
+      last = None
+    if last is not None:
+      age = time.time() - last_time
+      if age < self.opts.data_fresh:
+        self.screen.set_data_time(last_time)
+        return last
+
+    try:
+      data = fetch()
+    except:
+      if last is not None and age < self.opts.data_max_age:
+        self.screen.set_data_time(last_time)
+        return last
+      raise
+    self.save_data(data)
+    return data
+
   # --- create fonts   -----------------------------------------------------
 
   def create_fonts(self):
-    """ create fonts """
+    """ create fonts - fonts should be fetched on first use from
+        self.screen.fonts instead """
     pass
 
+  # --- time of next change of content   -----------------------------------
+
+  def get_next_change(self):
+    """ return time (datetime) when the content will change or None """
+
+    return None
+
+  # --- fetch data   --------------------------------------------------------
+
+  def fetch(self):
+    """ fetch data (network I/O). Called in a background-thread before
+        render(), possibly concurrently to other providers and to the
+        setup of the screen. Must not raise exceptions. """
+    pass
+
+  # --- hosts needed by the provider   ---------------------------------------
+
+  def get_urls(self):
+    """ return list of urls the provider needs for fetching data """
+
+    return []
+
+  # --- shared data   --------------------------------------------------------
+
+  def get_data_key(self):
+    """ return key (string) identifying the source of the data or None.
+        Providers of different screens with the same key share the data
+        (see daily_batch.py). """
+
+    return None
+
+  def get_data(self):
+    """ return fetched data (picklable) """
+
+    raise NotImplementedError
+
+  def set_data(self,data):
+    """ use data of another provider instead of fetching it """
+
+    raise NotImplementedError
+
+  # --- render content   -----------------------------------------------------
+
+  def render(self,canvas,region):
+    """ render fetched data into region of canvas (no network I/O) """
+
+    self.set_canvas(canvas)
+    self.set_region(region)
+    self.draw_content()
+
   # --- draw content on screen   ---------------------------------------------
 
   def draw_content(self):
-    """ draw content - must be implemented by subclasses """
+    """ draw content within self.region - must be implemented by
+        subclasses """
     raise NotImplementedError
@@ -0,0 +1,67 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# pi-e-ink-daily: daily agenda on a wHat e-ink display
+#
+# Pool of fonts: fonts are loaded on first use and shared by the screen
+# and all content-providers.
+#
+# Author: Bernhard Bablok
+# License: GPL3
+#
+# Website: https://github.com/bablokb/pi-e-ink-daily
+#
+# ----------------------------------------------------------------------------
+
+import threading, time
+
+class FontPool(object):
+
+  _shared = None
+
+  # --- constructor   --------------------------------------------------------
+
+  def __init__(self):
+    """ create empty pool """
+
+    self._fonts = {}
+    self._lock  = threading.Lock()
+    self._stats = {'loads': 0, 'hits': 0, 'load_time': 0.0}
+
+  # --- return process-wide pool   -------------------------------------------
+
+  @classmethod
+  def shared(cls):
+    """ return process-wide pool """
+
+    if cls._shared is None:
+      cls._shared = FontPool()
+    return cls._shared
+
+  # --- return font   --------------------------------------------------------
+
+  def get(self,path,size):
+    """ return font, load it on first use """
+
+    key = (path,size)
+    with self._lock:
+      font = self._fonts.get(key,None)
+      if font:
+        self._stats['hits'] += 1
+        return font
+
+      start = time.monotonic()
+      from PIL import ImageFont
+      font  = ImageFont.truetype(path,size)
+      self._stats['load_time'] += time.monotonic() - start
+      self._stats['loads'] += 1
+      self._fonts[key] = font
+      return font
+
+  # --- return statistics   --------------------------------------------------
+
+  def get_stats(self):
+    """ return dict with number of loads, hits and total load-time (s) """
+
+    with self._lock:
+      return dict(self._stats)
@@ -0,0 +1,136 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# pi-e-ink-daily: daily agenda on a wHat e-ink display
+#
+# Run-scoped pool of HTTP-connections shared by all content-providers.
+#
+# Author: Bernhard Bablok
+# License: GPL3
+#
+# Website: https://github.com/bablokb/pi-e-ink-daily
+#
+# ----------------------------------------------------------------------------
+
+import ssl, threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# --- ssl-context which reuses TLS-sessions   --------------------------------
+
+class ResumingContext(ssl.SSLContext):
+  """ ssl-context which tries to resume the last TLS-session of a host """
+
+  def __init__(self,protocol):
+    super(ResumingContext,self).__init__()
+    self._sessions = {}
+    self._lock     = threading.Lock()
+
+  def wrap_socket(self,sock,*args,server_hostname=None,session=None,
+                  **kwargs):
+    with self._lock:
+      if session is None:
+        session = self._sessions.get(server_hostname,None)
+    try:
+      ssock = super(ResumingContext,self).wrap_socket(
+        sock,*args,server_hostname=server_hostname,session=session,**kwargs)
+    except ValueError:
+      # session not usable, e.g. because it belongs to a different context
+      ssock = super(ResumingContext,self).wrap_socket(
+        sock,*args,server_hostname=server_hostname,**kwargs)
+    if ssock.session is not None:
+      with self._lock:
+        self._sessions[server_hostname] = ssock.session
+    return ssock
+
+# --- adapter using a given ssl-context   ------------------------------------
+
+class PoolAdapter(HTTPAdapter):
+  """ HTTPAdapter with an optional shared ssl-context """
+
+  def __init__(self,ssl_context=None,**kwargs):
+    self._ssl_context = ssl_context
+    super(PoolAdapter,self).__init__(**kwargs)
+
+  def init_poolmanager(self,*args,**kwargs):
+    if self._ssl_context:
+      kwargs["ssl_context"] = self._ssl_context
+    super(PoolAdapter,self).init_poolmanager(*args,**kwargs)
+
+# --- session with default timeouts   ----------------------------------------
+
+class PoolSession(requests.Session):
+  """ session with default timeouts """
+
+  def __init__(self,timeout):
+    super(PoolSession,self).__init__()
+    self._timeout = timeout
+
+  def request(self,method,url,**kwargs):
+    if kwargs.get("timeout",None) is None:
+      kwargs["timeout"] = self._timeout
+    return super(PoolSession,self).request(method,url,**kwargs)
+
+# --- pool of HTTP-connections   ---------------------------------------------
+
+class HttpPool(object):
+
+  # --- constructor   --------------------------------------------------------
+
+  def __init__(self,timeout=(5,20),pool_size=8,tls_resume=False):
+    """ create session with keep-alive connections (one pool per host) """
+
+    if tls_resume:
+      ssl_context = ResumingContext(ssl.PROTOCOL_TLS_CLIENT)
+      ssl_context.load_default_certs()
+    else:
+      ssl_context = None
+
+    self.session = PoolSession(tuple(timeout))
+    self.session.headers["Accept-Encoding"] = "gzip, deflate"
+    self.session.hooks["response"].append(self._count)
+    self._stats_lock = threading.Lock()
+    self.reset_stats()
+    adapter = PoolAdapter(ssl_context=ssl_context,
+                          pool_connections=pool_size,
+                          pool_maxsize=pool_size)
+    self.session.mount("https://",adapter)
+    self.session.mount("http://",PoolAdapter(pool_connections=pool_size,
+                                             pool_maxsize=pool_size))
+
+  # --- count requests and transferred bytes   ------------------------------
+
+  def _count(self,response,*args,**kwargs):
+    """ response-hook: update statistics """
+
+    body = response.request.body
+    sent = len(body) if body else 0
+    received = response.headers.get("Content-Length",None)
+    if received is None:
+      received = len(response.content)
+    with self._stats_lock:
+      self._stats["requests"]  += 1
+      self._stats["bytes_out"] += sent
+      self._stats["bytes_in"]  += int(received)
+
+  # --- statistics   ---------------------------------------------------------
+
+  def get_stats(self):
+    """ return dict with number of requests and transferred bytes (bodies) """
+
+    with self._stats_lock:
+      return dict(self._stats)
+
+  def reset_stats(self):
+    """ reset statistics """
+
+    with self._stats_lock:
+      self._stats = {"requests": 0, "bytes_in": 0, "bytes_out": 0}
+
+  # --- close all connections   ----------------------------------------------
+
+  def close(self):
+    """ close all connections """
+
+    self.session.close()
@@ -12,84 +12,235 @@
 #
 # ----------------------------------------------------------------------------
 
-import requests, json, datetime
+import json, datetime, time, re
+from array import array
+from collections.abc import Sequence
+from email.utils import parsedate_to_datetime
 
-# --- helper class (value-holder)   ------------------------------------------
+from CacheFile import CacheFile
+
+# --- accessor for a single entry of a forecast   ----------------------------
 
 class Values(object):
-  pass
+  """ view of a single entry of a Forecast, derived values are computed
+      on demand """
+
+  __slots__ = ('_fc','_i')
+
+  def __init__(self,fc,i):
+    self._fc = fc
+    self._i  = i
+
+  @property
+  def dt(self):
+    return datetime.datetime.fromtimestamp(self._fc._dt[self._i])
+
+  @property
+  def temp(self):
+    return self._fc._temp[self._i]
+
+  @property
+  def tmin(self):
+    return self._fc._tmin[self._i]
+
+  @property
+  def tmax(self):
+    return self._fc._tmax[self._i]
+
+  @property
+  def sunrise(self):
+    if self._fc._sunrise is None:
+      raise AttributeError("sunrise")
+    return datetime.datetime.fromtimestamp(self._fc._sunrise[self._i])
+
+  @property
+  def sunset(self):
+    if self._fc._sunset is None:
+      raise AttributeError("sunset")
+    return datetime.datetime.fromtimestamp(self._fc._sunset[self._i])
+
+  @property
+  def pressure(self):
+    return self._fc._pressure[self._i]
+
+  @property
+  def humidity(self):
+    return self._fc._humidity[self._i]
+
+  @property
+  def wind_speed(self):
+    return self._fc._wind_speed[self._i]*3.6       # m/s -> km/h
+
+  @property
+  def wind_deg(self):
+    return self._fc._wind_deg[self._i]
+
+  @property
+  def wind_dir(self):
+    return OWMData.DIRECTION[int((int(self.wind_deg)+22.5)/45)]
+
+  @property
+  def id(self):
+    return self._fc._id[self._i]
+
+  @property
+  def icon(self):
+    return self._fc._icon[self._i]
+
+# --- columnar storage of forecast-data   ------------------------------------
+
+class Forecast(Sequence):
+  """ forecast-data (current, hourly or daily) stored in columns """
+
+  def __init__(self,entries):
+    self._dt         = array('d')
+    self._temp       = array('d')
+    self._tmin       = array('d')
+    self._tmax       = array('d')
+    self._pressure   = array('d')
+    self._humidity   = array('d')
+    self._wind_speed = array('d')
+    self._wind_deg   = array('d')
+    self._id         = array('l')
+    self._icon       = []
+    if entries and "sunrise" in entries[0]:
+      self._sunrise  = array('d')
+      self._sunset   = array('d')
+    else:
+      self._sunrise  = None
+      self._sunset   = None
+
+    for wdict in entries:
+      self._dt.append(wdict["dt"])
+      temp = wdict["temp"]
+      if isinstance(temp,(int,float)):
+        # current/hourly data
+        self._temp.append(temp)
+        self._tmin.append(temp)
+        self._tmax.append(temp)
+      else:
+        # daily data
+        self._temp.append(temp["day"])
+        self._tmin.append(temp["min"])
+        self._tmax.append(temp["max"])
+      if self._sunrise is not None:
+        self._sunrise.append(wdict["sunrise"])
+        self._sunset.append(wdict["sunset"])
+      self._pressure.append(wdict["pressure"])
+      self._humidity.append(wdict["humidity"])
+      self._wind_speed.append(wdict["wind_speed"])
+      self._wind_deg.append(wdict["wind_deg"])
+      self._id.append(wdict["weather"][0]["id"])
+      self._icon.append(wdict["weather"][0]["icon"])
+
+  def __len__(self):
+    return len(self._dt)
+
+  def __getitem__(self,i):
+    if isinstance(i,slice):
+      return [Values(self,j) for j in range(*i.indices(len(self)))]
+    if i < 0:
+      i += len(self)
+    if not 0 <= i < len(self):
+      raise IndexError("forecast index out of range")
+    return Values(self,i)
 
 # --- interface to OWM-one-call API (subset)   -------------------------------
 
 class OWMData(object):
   # API-URL from OpenWeatherMap
-  URL = "https://api.openweathermap.org/data/2.5/onecall?lat={0}&lon={1}&exclude=minutely,alerts&appid={2}&units=metric"
+  URL   = "https://api.openweathermap.org/data/2.5/onecall"
+  QUERY = "?lat={0}&lon={1}&exclude=minutely,alerts&appid={2}&units=metric"
 
   # wind-direction constants
   DIRECTION = ['N','NE','E','SE','S','SW','W','NW','N']
   
-  def __init__(self,latitude,longitude,api_key):
-    self._latitude  = latitude
-    self._longitude = longitude
-    self._api_key   = api_key
+  def __init__(self,latitude,longitude,api_key,cache_file=None,ttl=0,
+               session=None,url=None):
+    self._session    = session
+    self._url        = url or OWMData.URL
+    self._latitude   = latitude
+    self._longitude  = longitude
+    self._api_key    = api_key
+    self._cache_file = cache_file
+    self._ttl        = ttl
 
+    self.data    = None
+    self.expires = None                      # end of lifetime (timestamp)
     self.current = None
-    self.hours   = []
-    self.days    = []
-
-  # --- parse data   ---------------------------------------------------------
-
-  def _parse_data(self,wdict):
-    """ parse data from weather-dict """
- 
-    val            = Values()
-    val.dt         = datetime.datetime.fromtimestamp(wdict["dt"])
-    if isinstance(wdict["temp"],(int,float)):
-      # hourly data
-      val.temp       = wdict["temp"]
-      val.tmin       = wdict["temp"]
-      val.tmax       = wdict["temp"]
-    else:
-      # current/daily data
-      val.temp       = wdict["temp"]["day"]
-      val.tmin       = wdict["temp"]["min"]
-      val.tmax       = wdict["temp"]["max"]
-    if "sunrise" in wdict:
-      val.sunrise    = datetime.datetime.fromtimestamp(wdict["sunrise"])
-      val.sunset     = datetime.datetime.fromtimestamp(wdict["sunset"])
-    val.pressure   = wdict["pressure"]
-    val.humidity   = wdict["humidity"]
-    val.wind_speed = wdict["wind_speed"]*3.6       # m/s -> km/h
-    val.wind_deg   = wdict["wind_deg"]
-    val.wind_dir   = OWMData.DIRECTION[int((int(val.wind_deg)+22.5)/45)]
-    val.id         = wdict["weather"][0]["id"]
-    val.icon       = wdict["weather"][0]["icon"]
-    return val
+    self.hours   = Forecast([])
+    self.days    = Forecast([])
 
   # --- query weather-data from OWM   ----------------------------------------
 
   def update(self):
-    """ query weather data """
+    """ query weather data (from the cache if possible) """
+
+    # check cache
+    key   = "%r,%r" % (self._latitude,self._longitude)
+    cache = CacheFile(self._cache_file) if self._cache_file else None
+    if cache and self._ttl > 0:
+      entry = cache.load().get(key,None)
+      if entry and time.time() < entry["expires"]:
+        self.parse(entry["data"])
+        self.expires = entry["expires"]
+        return
 
-    url = OWMData.URL.format(self._latitude,self._longitude,self._api_key)
+    url = self._url + OWMData.QUERY.format(self._latitude,self._longitude,
+                                           self._api_key)
 
     # query data
-    response = requests.get(url)
+    if self._session:
+      response = self._session.get(url)
+    else:
+      import requests
+      response = requests.get(url)
+    response.raise_for_status()
     data = json.loads(response.text)
     response.close()
+    self.parse(data)
+
+    # update cache
+    if cache and self._ttl > 0:
+      ttl = self._get_ttl(response.headers)
+      if ttl > 0:
+        now = time.time()
+        entries = {k: v for k,v in cache.load().items()
+                                               if v.get("expires",0) > now}
+        entries[key] = {"expires": now + ttl, "data": data}
+        cache.save(entries)
+        self.expires = now + ttl
+
+  # --- calculate time-to-live of response   ---------------------------------
+
+  def _get_ttl(self,headers):
+    """ return configured ttl, limited by the caching-headers of the server """
+
+    ttl = self._ttl
+    cache_control = headers.get("Cache-Control","").lower()
+    if "no-store" in cache_control or "no-cache" in cache_control:
+      return 0
+
+    max_age = re.search(r"max-age=(\d+)",cache_control)
+    if max_age:
+      ttl = min(ttl,int(max_age.group(1)) - int(headers.get("Age",0)))
+    elif "Expires" in headers:
+      try:
+        expires = parsedate_to_datetime(headers["Expires"]).timestamp()
+        ttl = min(ttl,expires - time.time())
+      except Exception:
+        ttl = 0                          # invalid dates mean "expired"
+    return ttl
+
+  # --- parse weather-data   -------------------------------------------------
+
+  def parse(self,data):
+    """ parse weather data (response of the one-call API) """
 
-    # current
-    self.current = self._parse_data(data["current"])
-    
-    # next hour forecast
-    self.hours.clear()
-    for hour in data["hourly"]:
-      self.hours.append(self._parse_data(hour))
-
-    # next days forecast
-    self.days.clear()
-    for day in data["daily"]:
-      self.days.append(self._parse_data(day))
+    self.data    = data
+    self.current = Forecast([data["current"]])[0]
+    self.hours   = Forecast(data["hourly"])   # next hour forecast
+    self.days    = Forecast(data["daily"])    # next days forecast
 
   # --- print value-object   -------------------------------------------------
 
@@ -0,0 +1,100 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# pi-e-ink-daily: daily agenda on a wHat e-ink display
+#
+# Check the network-availability of hosts (DNS and TCP-connect). All hosts
+# are checked concurrently with exponential backoff until a deadline.
+#
+# Author: Bernhard Bablok
+# License: GPL3
+#
+# Website: https://github.com/bablokb/pi-e-ink-daily
+#
+# ----------------------------------------------------------------------------
+
+import socket, threading, time
+from urllib.parse import urlparse
+
+class Probe(object):
+
+  # --- constructor   --------------------------------------------------------
+
+  def __init__(self,hosts,deadline=20,timeout=2,backoff=0.25,max_backoff=4):
+    """ hosts: list of (host,port) """
+
+    self._hosts       = sorted(set(hosts))
+    self._deadline    = deadline
+    self._timeout     = timeout
+    self._backoff     = backoff
+    self._max_backoff = max_backoff
+    self._events      = {host: threading.Event() for host in self._hosts}
+    self._result      = {}
+    self._end         = None
+
+  # --- (host,port) of an url   ----------------------------------------------
+
+  @staticmethod
+  def get_host(url):
+    """ return tuple (host,port) of an url """
+
+    url = urlparse(url)
+    return (url.hostname,url.port or (80 if url.scheme == "http" else 443))
+
+  # --- start checks   -------------------------------------------------------
+
+  def start(self):
+    """ start checking all hosts (one thread per host) """
+
+    self._end = time.monotonic() + self._deadline
+    for host in self._hosts:
+      threading.Thread(target=self._check,args=(host,),daemon=True).start()
+    return self
+
+  # --- check a single host   ------------------------------------------------
+
+  def _check(self,host):
+    """ check host until it is available or the deadline is reached """
+
+    delay = self._backoff
+    while True:
+      try:
+        for family,socktype,proto,_,addr in socket.getaddrinfo(
+                                   host[0],host[1],type=socket.SOCK_STREAM):
+          timeout = min(self._timeout,self._end-time.monotonic())
+          with socket.socket(family,socktype,proto) as sock:
+            sock.settimeout(max(0.1,timeout))
+            try:
+              sock.connect(addr)
+            except OSError:
+              continue
+          self._result[host] = True
+          self._events[host].set()
+          return
+      except OSError:
+        pass                                    # DNS not (yet) available
+
+      if time.monotonic() + delay >= self._end:
+        self._result[host] = False
+        self._events[host].set()
+        return
+      time.sleep(delay)
+      delay = min(2*delay,self._max_backoff)
+
+  # --- wait for a host   ----------------------------------------------------
+
+  def wait(self,host):
+    """ wait until host is available or the deadline is reached.
+        Returns True if the host is available (or not checked at all). """
+
+    if host not in self._events:
+      return True
+    self._events[host].wait(max(0,self._end-time.monotonic()))
+    return self._result.get(host,False)
+
+  # --- wait for all hosts   -------------------------------------------------
+
+  def wait_all(self):
+    """ wait for all hosts, return dict (host,port) -> available """
+
+    return {host: self.wait(host) for host in self._hosts}
@@ -0,0 +1,186 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# pi-e-ink-daily: daily agenda on a wHat e-ink display
+#
+# Map RGB-images to the palette of the display (palette-indices as used by
+# the display, i.e. the native buffer).
+#
+# With numpy, a 3D lookup-table (cached on disk) maps every color to the
+# nearest color of the palette, optionally with ordered dithering. Without
+# numpy, PIL's quantize() is used.
+#
+# Author: Bernhard Bablok
+# License: GPL3
+#
+# Website: https://github.com/bablokb/pi-e-ink-daily
+#
+# ----------------------------------------------------------------------------
+
+import os, hashlib, tempfile
+
+from PIL import Image
+
+# 4x4 Bayer-matrix for ordered dithering
+BAYER = [[ 0, 8, 2,10],
+         [12, 4,14, 6],
+         [ 3,11, 1, 9],
+         [15, 7,13, 5]]
+
+class Quantizer(object):
+
+  # --- constructor   --------------------------------------------------------
+
+  def __init__(self,palette,cache_dir=None,bits=5,dither=False):
+    """ palette: dict index -> (r,g,b) of the display """
+
+    self._palette   = dict(palette)
+    self._cache_dir = cache_dir
+    self._bits      = bits
+    self._dither    = dither
+    self._lut       = None
+
+    try:
+      import numpy
+      self._np = numpy
+    except ImportError:
+      self._np = None
+
+    # flat palette for P-images (unused indices are black)
+    size = max(self._palette) + 1
+    self._flat = []
+    for i in range(size):
+      self._flat.extend(self._palette.get(i,(0,0,0)))
+
+  # --- palette of P-images   ------------------------------------------------
+
+  def get_palette(self):
+    """ return flat palette (r,g,b,r,g,b,...) usable for putpalette() """
+
+    return list(self._flat)
+
+  # --- quantize image   -----------------------------------------------------
+
+  def quantize(self,image):
+    """ return P-image with palette-indices of the display """
+
+    rgb = image.convert("RGB")
+    if self._np:
+      result = self._quantize_lut(rgb)
+    else:
+      result = self._quantize_pil(rgb)
+    if rgb is not image:
+      rgb.close()
+    return result
+
+  # --- quantize using the lookup-table   ------------------------------------
+
+  def _quantize_lut(self,image):
+    """ quantize with lookup-table (and optional ordered dithering) """
+
+    np    = self._np
+    shift = 8 - self._bits
+    data  = np.asarray(image,dtype=np.int16)
+
+    if self._dither:
+      # spread thresholds over the distance of two palette-levels
+      height, width = data.shape[:2]
+      bayer  = (np.array(BAYER,dtype=np.int16)*2 - 15)*4
+      offset = np.tile(bayer,(height//4+1,width//4+1))[:height,:width]
+      data   = np.clip(data + offset[:,:,None],0,255)
+
+    data = data >> shift
+    idx  = ((data[:,:,0] << (2*self._bits)) |
+            (data[:,:,1] << self._bits) | data[:,:,2])
+    result = Image.fromarray(self._get_lut()[idx],"P")
+    result.putpalette(self._flat)
+    return result
+
+  # --- quantize using PIL   -------------------------------------------------
+
+  def _quantize_pil(self,image):
+    """ quantize with PIL (slow, but needs no numpy) """
+
+    # PIL uses all 256 entries: fill unused entries with a valid color
+    # and map them back to the index of this color
+    first = min(self._palette)
+    remap = [i if i in self._palette else first for i in range(256)]
+    flat  = []
+    for i in remap:
+      flat.extend(self._palette[i])
+
+    pal_image = Image.new("P",(1,1))
+    pal_image.putpalette(flat)
+    dither = Image.FLOYDSTEINBERG if self._dither else Image.NONE
+    result = image.quantize(palette=pal_image,dither=dither).point(remap)
+    result.putpalette(self._flat)
+    return result
+
+  # --- return lookup-table   ------------------------------------------------
+
+  def _get_lut(self):
+    """ load lookup-table from disk or create it """
+
+    if self._lut is not None:
+      return self._lut
+
+    path = self._get_lut_path()
+    size = 1 << (3*self._bits)
+    if path and os.path.exists(path):
+      lut = self._np.fromfile(path,dtype=self._np.uint8)
+      if lut.size == size:
+        self._lut = lut
+        return lut
+
+    self._lut = self._create_lut()
+    if path:
+      self._save_lut(path)
+    return self._lut
+
+  # --- create lookup-table   ------------------------------------------------
+
+  def _create_lut(self):
+    """ map center of every cell of the rgb-cube to the nearest color """
+
+    np     = self._np
+    levels = 1 << self._bits
+    center = (np.arange(levels,dtype=np.int32) << (8-self._bits)) + (
+                                                   (1 << (8-self._bits)) >> 1)
+    r, g, b = np.meshgrid(center,center,center,indexing="ij")
+    cube    = np.stack([r.ravel(),g.ravel(),b.ravel()],axis=1)
+
+    indices = np.array(sorted(self._palette),dtype=np.uint8)
+    colors  = np.array([self._palette[i] for i in indices],dtype=np.int32)
+    dist    = ((cube[:,None,:] - colors[None,:,:])**2).sum(axis=2)
+    return indices[dist.argmin(axis=1)]
+
+  # --- path of lookup-table   -----------------------------------------------
+
+  def _get_lut_path(self):
+    """ file-name depends on palette and resolution """
+
+    if not self._cache_dir:
+      return None
+    key = hashlib.sha1(repr((sorted(self._palette.items()),
+                             self._bits)).encode("utf-8")).hexdigest()
+    return os.path.join(self._cache_dir,"palette-%s.lut" % key[:12])
+
+  # --- save lookup-table   --------------------------------------------------
+
+  def _save_lut(self,path):
+    """ save lookup-table atomically """
+
+    tmp = None
+    try:
+      os.makedirs(self._cache_dir,exist_ok=True)
+      fd, tmp = tempfile.mkstemp(dir=self._cache_dir,prefix=".cache-")
+      with os.fdopen(fd,"wb") as f:
+        f.write(self._lut.tobytes())
+      os.replace(tmp,path)
+    except Exception:
+      # a cache is an optimization: never fail because of it
+      if tmp:
+        try:
+          os.unlink(tmp)
+        except Exception:
+          pass
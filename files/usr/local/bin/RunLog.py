@@ -0,0 +1,117 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# pi-e-ink-daily: daily agenda on a wHat e-ink display
+#
+# Rotating log of runs (one JSON-record per line) and its summary.
+#
+# Author: Bernhard Bablok
+# License: GPL3
+#
+# Website: https://github.com/bablokb/pi-e-ink-daily
+#
+# ----------------------------------------------------------------------------
+
+import os, json, math, traceback
+
+class RunLog(object):
+
+  # --- constructor   --------------------------------------------------------
+
+  def __init__(self,path,max_size=262144,backups=2):
+    """ log is rotated to path.1 ... path.backups when larger than max_size """
+
+    self._path     = path
+    self._max_size = max_size
+    self._backups  = backups
+
+  # --- append a record   ----------------------------------------------------
+
+  def append(self,record):
+    """ append record (dict) to log - never raises exceptions """
+
+    try:
+      os.makedirs(os.path.dirname(self._path) or ".",exist_ok=True)
+      self._rotate()
+      with open(self._path,"a") as f:
+        f.write(json.dumps(record,separators=(',',':'))+"\n")
+    except Exception:
+      traceback.print_exc()
+
+  # --- rotate log   ---------------------------------------------------------
+
+  def _rotate(self):
+    """ rotate log if necessary """
+
+    if (not os.path.exists(self._path) or
+        os.path.getsize(self._path) < self._max_size):
+      return
+    for i in range(self._backups,0,-1):
+      src = "%s.%d" % (self._path,i-1) if i > 1 else self._path
+      if os.path.exists(src):
+        os.replace(src,"%s.%d" % (self._path,i))
+    if os.path.exists(self._path):
+      os.remove(self._path)                    # no backups configured
+
+  # --- read all records   ---------------------------------------------------
+
+  def read(self):
+    """ return all records (oldest first), invalid lines are ignored """
+
+    records = []
+    paths = ["%s.%d" % (self._path,i) for i in range(self._backups,0,-1)]
+    for path in paths + [self._path]:
+      if not os.path.exists(path):
+        continue
+      with open(path,"r") as f:
+        for line in f:
+          try:
+            records.append(json.loads(line))
+          except ValueError:
+            pass
+    return records
+
+  # --- percentile   ---------------------------------------------------------
+
+  @staticmethod
+  def percentile(values,p):
+    """ return p-th percentile (nearest rank) of values """
+
+    if not values:
+      return None
+    values = sorted(values)
+    return values[max(0,math.ceil(p/100*len(values))-1)]
+
+  # --- summary   ------------------------------------------------------------
+
+  def get_summary(self):
+    """ return summary (p50/p95 of the run-time per day) as string """
+
+    days = {}
+    for record in self.read():
+      days.setdefault(record["time"][:10],[]).append(record)
+
+    lines = ["%-10s %5s %8s %8s %8s %7s %9s" % (
+      "day","runs","p50 s","p95 s","fetch s","skipped","kB/run")]
+    all_runs = []
+    for day in sorted(days):
+      records = days[day]
+      all_runs.extend(records)
+      lines.append(self._get_line(day,records))
+    if all_runs:
+      lines.append(self._get_line("total",all_runs))
+    return "\n".join(lines)
+
+  # --- summary of some records   --------------------------------------------
+
+  def _get_line(self,label,records):
+    """ return a single line of the summary """
+
+    elapsed = [r["elapsed"] for r in records]
+    fetch   = [r["phases"].get("fetch",0.0) for r in records]
+    skipped = sum(1 for r in records if not r.get("refreshed",False))
+    kbytes  = sum(r.get("http_bytes_in",0)+r.get("http_bytes_out",0)
+                                            for r in records)/1024/len(records)
+    return "%-10s %5d %8.2f %8.2f %8.2f %7d %9.1f" % (
+      label,len(records),self.percentile(elapsed,50),
+      self.percentile(elapsed,95),self.percentile(fetch,50),skipped,kbytes)
@@ -0,0 +1,70 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# pi-e-ink-daily: daily agenda on a wHat e-ink display
+#
+# Cached measurement of text and layout-helpers. Uses getbbox(), since
+# ImageDraw.textsize() is not available in current versions of Pillow.
+#
+# Author: Bernhard Bablok
+# License: GPL3
+#
+# Website: https://github.com/bablokb/pi-e-ink-daily
+#
+# ----------------------------------------------------------------------------
+
+import functools
+
+class TextMeasure(object):
+
+  _shared = None
+
+  # --- constructor   --------------------------------------------------------
+
+  def __init__(self,maxsize=512):
+    """ create LRU-cache for text-sizes """
+
+    self.size = functools.lru_cache(maxsize=maxsize)(self._size)
+
+  # --- return process-wide instance   ---------------------------------------
+
+  @classmethod
+  def shared(cls):
+    """ return process-wide instance """
+
+    if cls._shared is None:
+      cls._shared = TextMeasure()
+    return cls._shared
+
+  # --- measure text   -------------------------------------------------------
+
+  def _size(self,font,text):
+    """ return size (width,height) of text (like the old textsize()) """
+
+    if hasattr(font,"getbbox"):
+      bbox = font.getbbox(text)
+      return (bbox[2],bbox[3])
+    else:
+      return font.getsize(text)
+
+  # --- center text   --------------------------------------------------------
+
+  def center(self,font,text,width):
+    """ return x-offset to center text within the given width """
+
+    return int((width-self.size(font,text)[0])/2)
+
+  # --- align text to the right   --------------------------------------------
+
+  def right(self,font,text,width):
+    """ return x-offset to right-align text within the given width """
+
+    return width-self.size(font,text)[0]
+
+  # --- return statistics   --------------------------------------------------
+
+  def get_stats(self):
+    """ return dict with hits and misses of the cache """
+
+    info = self.size.cache_info()
+    return {'hits': info.hits, 'misses': info.misses}
@@ -0,0 +1,203 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# pi-e-ink-daily: daily agenda on a wHat e-ink display
+#
+# Timing of program-phases and of module-imports (similar to
+# python3 -X importtime, but aggregated per phase).
+#
+# Author: Bernhard Bablok
+# License: GPL3
+#
+# Website: https://github.com/bablokb/pi-e-ink-daily
+#
+# ----------------------------------------------------------------------------
+
+import sys, time, threading
+import importlib.abc
+from contextlib import contextmanager
+
+# --- loader-wrapper which measures the execution of modules   ---------------
+
+class TimedLoader(importlib.abc.Loader):
+  """ wrapper for a loader, measures exec_module() """
+
+  def __init__(self,loader,timer):
+    self._loader = loader
+    self._timer  = timer
+
+  def __getattr__(self,name):
+    return getattr(self._loader,name)
+
+  def create_module(self,spec):
+    return self._loader.create_module(spec)
+
+  def exec_module(self,module):
+    # restore original loader, so only the execution is wrapped
+    if module.__spec__ is not None:
+      module.__spec__.loader = self._loader
+    module.__loader__ = self._loader
+
+    stack = self._timer._get_import_stack()
+    stack.append(0.0)
+    start = time.monotonic()
+    try:
+      self._loader.exec_module(module)
+    finally:
+      cumulative = time.monotonic() - start
+      nested = stack.pop()
+      if stack:
+        stack[-1] += cumulative
+      self._timer._add_import(module.__name__,cumulative-nested,cumulative)
+
+# --- meta-path finder which installs the TimedLoader   ----------------------
+
+class TimedFinder(importlib.abc.MetaPathFinder):
+  """ find modules using the other finders and wrap their loaders """
+
+  def __init__(self,timer):
+    self._timer = timer
+
+  def find_spec(self,name,path,target=None):
+    for finder in sys.meta_path:
+      if finder is self or not hasattr(finder,"find_spec"):
+        continue
+      spec = finder.find_spec(name,path,target)
+      if spec is not None:
+        if spec.loader is not None and hasattr(spec.loader,"exec_module"):
+          spec.loader = TimedLoader(spec.loader,self._timer)
+        return spec
+    return None
+
+# --- timer for phases and imports   -----------------------------------------
+
+class PhaseTimer(object):
+
+  _shared = None
+
+  # --- constructor   --------------------------------------------------------
+
+  def __init__(self):
+    """ create empty timer """
+
+    self.start    = time.monotonic()
+    self.phases   = {}               # phase -> duration (s)
+    self.imports  = {}               # phase -> [(module,self,cumulative)]
+    self._lock    = threading.Lock()
+    self._finder  = None
+    self._local   = threading.local()  # current phase and import-stack
+    self._local.current = "startup"
+
+  # --- current phase of the calling thread   --------------------------------
+
+  @property
+  def _current(self):
+    return getattr(self._local,"current","background")
+
+  @_current.setter
+  def _current(self,name):
+    self._local.current = name
+
+  # --- import-stack of the calling thread   ---------------------------------
+
+  def _get_import_stack(self):
+    if not hasattr(self._local,"import_stack"):
+      self._local.import_stack = []
+    return self._local.import_stack
+
+  # --- return process-wide timer   ------------------------------------------
+
+  @classmethod
+  def shared(cls):
+    """ return process-wide timer """
+
+    if cls._shared is None:
+      cls._shared = PhaseTimer()
+    return cls._shared
+
+  # --- measure a phase   ----------------------------------------------------
+
+  @contextmanager
+  def phase(self,name):
+    """ context-manager measuring a phase (durations of repeated phases
+        are added). Phases are tracked per thread. """
+
+    previous      = self._current
+    self._current = name
+    start = time.monotonic()
+    try:
+      yield
+    finally:
+      duration = time.monotonic() - start
+      with self._lock:
+        self.phases[name] = self.phases.get(name,0.0) + duration
+      self._current = previous
+
+  # --- elapsed time   -------------------------------------------------------
+
+  def get_elapsed(self):
+    """ return time (s) since creation or the last reset of the phases """
+
+    return time.monotonic() - self.start
+
+  # --- reset phases   -------------------------------------------------------
+
+  def reset_phases(self):
+    """ reset durations of phases (e.g. after every update in daemon-mode) """
+
+    with self._lock:
+      self.phases = {}
+    self.start = time.monotonic()
+
+  # --- start/stop timing of imports   ---------------------------------------
+
+  def start_import_timing(self):
+    """ install import-hook """
+
+    if not self._finder:
+      self._finder = TimedFinder(self)
+      sys.meta_path.insert(0,self._finder)
+
+  def stop_import_timing(self):
+    """ remove import-hook """
+
+    if self._finder:
+      sys.meta_path.remove(self._finder)
+      self._finder = None
+
+  # --- record an import   ---------------------------------------------------
+
+  def _add_import(self,module,self_time,cumulative):
+    with self._lock:
+      self.imports.setdefault(self._current,[]).append(
+                                                (module,self_time,cumulative))
+
+  # --- return import-time   -------------------------------------------------
+
+  def get_import_time(self,phase=None):
+    """ return total import-time (s) of a phase or of all phases """
+
+    with self._lock:
+      if phase:
+        return sum(i[1] for i in self.imports.get(phase,[]))
+      return sum(i[1] for imports in self.imports.values() for i in imports)
+
+  # --- create report   ------------------------------------------------------
+
+  def get_import_report(self,top=5):
+    """ return import-report (one block per phase) as string """
+
+    lines = ["%-12s %8s %8s %7s" % ("phase","phase ms","import ms","modules")]
+    with self._lock:
+      names = list(self.phases) + [p for p in self.imports
+                                                   if p not in self.phases]
+      for phase in names:
+        imports = self.imports.get(phase,[])
+        lines.append("%-12s %8.1f %8.1f %7d" % (
+          phase,1000*self.phases.get(phase,0.0),
+          1000*sum(i[1] for i in imports),len(imports)))
+        for module,self_time,cumulative in sorted(
+                              imports,key=lambda i: i[2],reverse=True)[:top]:
+          lines.append("  %-30s self %7.1f ms  cumulative %7.1f ms" % (
+            module,1000*self_time,1000*cumulative))
+    return "\n".join(lines)
@@ -18,15 +18,28 @@
 #
 # ----------------------------------------------------------------------------
 
-import requests, traceback
-
-from PIL import ImageFont
+import datetime
+import json
+import traceback
 
 from ContentProvider import ContentProvider
 from OWMData         import OWMData
 
 class WeatherContentProvider(ContentProvider):
 
+  OWM_CACHE = "owm-cache.json"
+
+  SCHEMA = {
+    "WI_SIZE":       int,
+    "WDIR_SIZE":     int,
+    "BIG_SIZE":      int,
+    "owm_latitude":  (int,float),
+    "owm_longitude": (int,float),
+    "owm_apikey":    str,
+    "owm_url":       str,
+    "owm_ttl":       (int,float)
+    }
+
   # map weather-condition to icon: id: (day,night). Only a few
   # conditions (cloudy, sunny) map to different night icons, although a
   # complete set of night-icons would be available
@@ -117,30 +130,33 @@ class WeatherContentProvider(ContentProvider):
   def __init__(self,screen):
     """ constructor """
     super(WeatherContentProvider,self).__init__(screen)
+    self._fetched = False
+    self._owm     = None
+
+  # --- fonts (loaded on first use)   ---------------------------------------
 
-  # --- create fonts   -----------------------------------------------------
+  @property
+  def _wi_font(self):
+    """ weather-icons """
+    return self.screen.fonts.get(self.opts.WI_FONT,self.opts.WI_SIZE)
 
-  def create_fonts(self):
-    """ create fonts """
+  @property
+  def _wdir_font(self):
+    """ wind-direction icons """
+    return self.screen.fonts.get(self.opts.WDIR_FONT,self.opts.WDIR_SIZE)
 
-    # weather-icons
-    self._wi_font = ImageFont.truetype(self.opts.WI_FONT,
-                                         self.opts.WI_SIZE)
-    # wind-direction icons
-    self._wdir_font = ImageFont.truetype(self.opts.WDIR_FONT,
-                                         self.opts.WDIR_SIZE)
-    self._big_font  = ImageFont.truetype(self.opts.BIG_FONT,
-                                         self.opts.BIG_SIZE)
+  @property
+  def _big_font(self):
+    return self.screen.fonts.get(self.opts.BIG_FONT,self.opts.BIG_SIZE)
 
   # --- calculate available space for tiles   --------------------------------
 
   def _calc_tile_sizes(self):
     """ calculate tile sizes """
 
-    # screen-height - current offset - height of status-line
-    height = int((self.opts.HEIGHT - self.screen._y_off -
-                                            self.opts.HEIGHT_S)/2)
-    width4 = int(self.opts.WIDTH/4)
+    # two lines with four tiles within the region
+    height = int(self.region[3]/2)
+    width4 = int(self.region[2]/4)
     self._size = ((width4,height))
 
   # --- map weather-id to char of WI-font   --------------------------------
@@ -158,6 +174,15 @@ class WeatherContentProvider(ContentProvider):
     # otherwise return default ("n/a")
       return "\uf07b"
 
+  # --- draw text centered within tile   ------------------------------------
+
+  def _draw_centered(self,text,font,fill,x_off,y_off):
+    """ draw text centered within the tile, return height of text """
+
+    x_plus = self.screen.measure.center(font,text,self._size[0])
+    self.canvas.text((x_off+x_plus,y_off),text,font=font,fill=fill)
+    return self.screen.measure.size(font,text)[1]
+
   # --- draw current temperature   -------------------------------------------
 
   def _draw_current(self,cur,x_off,y_off):
@@ -165,27 +190,18 @@ class WeatherContentProvider(ContentProvider):
 
     # current temperature
     t = "{0:3.1f}°".format(cur.temp)
-    t_size = self.canvas.textsize(t,self._big_font,spacing=0)
-    x_plus = int((self._size[0]-t_size[0])/2)
-    self.canvas.text((x_off+x_plus,y_off),
-                     t,font=self._big_font,
-                     fill=self.opts.BIG_COLOR)
+    y_off += self._draw_centered(t,self._big_font,
+                                 self.opts.BIG_COLOR,x_off,y_off) + 1
 
     # wind direction icon
     icon = self.DIR_MAP[cur.wind_dir]
-    icon_size = self.canvas.textsize(icon,self._wdir_font,spacing=0)
-    x_plus = int((self._size[0]-icon_size[0])/2)
-    self.canvas.text((x_off+x_plus,y_off+t_size[1]+1),
-                     icon,font=self._wdir_font,
-                     fill=self.opts.WDIR_COLOR)
+    y_off += self._draw_centered(icon,self._wdir_font,
+                                 self.opts.WDIR_COLOR,x_off,y_off) + 2
 
     # wind speed
     s = "{0:d} km/h".format(round(cur.wind_speed))
-    s_size = self.canvas.textsize(s,self.screen._text_font,spacing=0)
-    x_plus = int((self._size[0]-s_size[0])/2)
-    self.canvas.text((x_off+x_plus,y_off+t_size[1]+1+icon_size[1]+2),
-                     s,font=self.screen._text_font,
-                     fill=self.opts.TEXT_COLOR)
+    self._draw_centered(s,self.screen._text_font,
+                        self.opts.TEXT_COLOR,x_off,y_off)
 
   # --- draw hourly forecast   -----------------------------------------------
 
@@ -194,26 +210,16 @@ class WeatherContentProvider(ContentProvider):
 
     # hour
     h = hour.dt.strftime("%H:%M")
-    h_size = self.canvas.textsize(h,self.screen._text_font,spacing=0)
-    x_plus = int((self._size[0]-h_size[0])/2)
-    self.canvas.text((x_off+x_plus,y_off),
-                     h,font=self.screen._text_font,
-                      fill=self.opts.TEXT_COLOR)
+    y_off += self._draw_centered(h,self.screen._text_font,
+                                 self.opts.TEXT_COLOR,x_off,y_off) + 1
     # temp
     t = "{0:3.1f}°".format(hour.temp)
-    t_size = self.canvas.textsize(t,self.screen._text_font,spacing=0)
-    x_plus = int((self._size[0]-t_size[0])/2)
-    self.canvas.text((x_off+x_plus,y_off+h_size[1]+1),
-                     t,font=self.screen._text_font,
-                     fill=self.opts.TEXT_COLOR)
+    y_off += self._draw_centered(t,self.screen._text_font,
+                                 self.opts.TEXT_COLOR,x_off,y_off) + 1
     # icon
     icon = self._map_id(hour.id,
                         current.sunrise<hour.dt and hour.dt < current.sunset)
-    icon_size = self.canvas.textsize(icon,self._wi_font,spacing=0)
-    x_plus = int((self._size[0]-icon_size[0])/2)
-    self.canvas.text((x_off+x_plus,y_off+h_size[1]+1+t_size[1]+1),
-                     icon,font=self._wi_font,
-                     fill=self.opts.WI_COLOR)
+    self._draw_centered(icon,self._wi_font,self.opts.WI_COLOR,x_off,y_off)
 
   # --- draw daily forecast   ------------------------------------------------
 
@@ -222,48 +228,104 @@ class WeatherContentProvider(ContentProvider):
 
     # day
     d = day.dt.strftime("%a %d.%m.")
-    d_size = self.canvas.textsize(d,self.screen._text_font,spacing=0)
-    x_plus = int((self._size[0]-d_size[0])/2)
-    self.canvas.text((x_off+x_plus,y_off),
-                     d,font=self.screen._text_font,
-                      fill=self.opts.TEXT_COLOR)
+    y_off += self._draw_centered(d,self.screen._text_font,
+                                 self.opts.TEXT_COLOR,x_off,y_off) + 1
     # temp
     t = "{0:d}°/{1:d}°".format(round(day.tmin),round(day.tmax))
-    t_size = self.canvas.textsize(t,self.screen._text_font,spacing=0)
-    x_plus = int((self._size[0]-t_size[0])/2)
-    self.canvas.text((x_off+x_plus,y_off+d_size[1]+1),
-                     t,font=self.screen._text_font,
-                     fill=self.opts.TEXT_COLOR)
+    y_off += self._draw_centered(t,self.screen._text_font,
+                                 self.opts.TEXT_COLOR,x_off,y_off) + 1
     # icon
     icon = self._map_id(day.id)
-    icon_size = self.canvas.textsize(icon,self._wi_font,spacing=0)
-    x_plus = int((self._size[0]-icon_size[0])/2)
-    self.canvas.text((x_off+x_plus,y_off+d_size[1]+1+t_size[1]+1),
-                     icon,font=self._wi_font,
-                     fill=self.opts.WI_COLOR)
-    
+    self._draw_centered(icon,self._wi_font,self.opts.WI_COLOR,x_off,y_off)
 
-  # --- draw content on screen   ---------------------------------------------
+  # --- time of next change of content   -----------------------------------
 
-  def draw_content(self):
-    """ draw weather-info """
+  def get_next_change(self):
+    """ return end of lifetime of the weather-data (see owm_ttl) """
 
-    try:
-      owm = OWMData(self.opts.owm_latitude,
-                    self.opts.owm_longitude,
-                    self.opts.owm_apikey)
+    if self._owm and self._owm.expires:
+      return datetime.datetime.fromtimestamp(self._owm.expires)
+    return None
+
+  # --- fetch data   --------------------------------------------------------
+
+  def fetch(self):
+    """ fetch weather-data """
+
+    owm = OWMData(self.opts.owm_latitude,
+                  self.opts.owm_longitude,
+                  self.opts.owm_apikey,
+                  cache_file=self.screen.get_cache_path(
+                                    WeatherContentProvider.OWM_CACHE),
+                  ttl=self.opts.owm_ttl,
+                  session=self.screen.get_http_session(),
+                  url=self.opts.owm_url)
+    def fetch():
+      self.screen.wait_host(self.opts.owm_url)     # network available
       owm.update()
+      return owm.data
+
+    try:
+      data = self.fetch_data(fetch)
+      if data is not owm.data:
+        owm.parse(data)                  # last good dataset
+      self._owm = owm
     except:
       #traceback.print_exc()
-      self.screen.rc = self.screen.RC_NO_UPDATE
+      self._owm = None
+    self._fetched = True
+
+  # --- hosts needed by the provider   ---------------------------------------
+
+  def get_urls(self):
+    return [self.opts.owm_url]
+
+  # --- shared data   --------------------------------------------------------
+
+  def get_data_key(self):
+    """ key: location """
+
+    return json.dumps(["WeatherContentProvider",self.opts.owm_url,
+                       self.opts.owm_latitude,self.opts.owm_longitude])
+
+  def get_data(self):
+    return self._owm.data if self._owm else None
+
+  def set_data(self,data):
+    if data is None:
+      self._owm = None
+    else:
+      self._owm = OWMData(self.opts.owm_latitude,self.opts.owm_longitude,
+                          self.opts.owm_apikey)
+      self._owm.parse(data)
+    self._fetched = True
+
+  # --- draw content on screen   ---------------------------------------------
+
+  def draw_content(self):
+    """ draw weather-info """
+
+    if not self._fetched:
+      self.fetch()
+    self._fetched = False
+
+    owm = self._owm
+    if not owm:
+      if len(self.screen.providers) > 1:
+        # don't block other providers
+        self.screen.rc = self.screen.RC_FAIL
+        self.screen.draw_image(self.screen.NO_CONNECT,self.region)
+      else:
+        self.screen.rc = self.screen.RC_NO_UPDATE
       return                             # ignore error, don't update display
 
     self._calc_tile_sizes()
 
     # current temperature
     height = self._size[1]
-    x_off = 0
-    y_off = self.screen._y_off
+    x0     = self.region[0]
+    x_off  = x0
+    y_off  = self._y_off
     self._draw_current(owm.current,x_off,y_off)
     x_off += self._size[0]
     self.canvas.line([(x_off,y_off),
@@ -294,12 +356,12 @@ class WeatherContentProvider(ContentProvider):
                                 (x_off,y_off+height)],
                                fill=self.opts.LINE_COLOR,width=1)
 
-    self.screen._y_off += height
-    self.screen._draw_hline(self.screen._y_off)
+    self._y_off += height
+    self.screen._draw_hline(self._y_off,x0,x0+self.region[2])
 
     # daily forecast
-    x_off = 0
-    y_off  = self.screen._y_off
+    x_off  = x0
+    y_off  = self._y_off
     height = self._size[1]
     for i in range(day_off,4+day_off):
       self._draw_day(owm.days[i],x_off,y_off)
@@ -308,4 +370,4 @@ class WeatherContentProvider(ContentProvider):
                               (x_off,y_off+height)],
                              fill=self.opts.LINE_COLOR,width=1)
 
-    self.screen._y_off += height
+    self._y_off += height
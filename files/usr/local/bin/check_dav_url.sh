@@ -2,7 +2,9 @@
 # ----------------------------------------------------------------------------
 # pi-e-ink-daily: daily agenda on a wHat e-ink display
 #
-# Check availability of configured caldav-server
+# Check availability of all configured servers (caldav-servers, OWM).
+# This is a wrapper for daily_agenda.py --probe, the optional argument is
+# the deadline in seconds.
 #
 # Author: Bernhard Bablok
 # License: GPL3
@@ -11,13 +13,6 @@
 #
 # ----------------------------------------------------------------------------
 
-max_tries="${1:-10}"
-server=$(sed -ne '/dav_url/s![^/]*//\([^/]*\)/.*!\1!p' /etc/pi-e-ink-daily.json)
+deadline="${1:-10}"
 
-let i=0
-while [ $i -lt $max_tries ]; do
-  ping -c 1 -W 1 "$server" 2>&1 1>/dev/null && exit 0
-  let i+=1
-done
-
-exit 1
+exec /usr/local/bin/daily_agenda.py --probe "$deadline"
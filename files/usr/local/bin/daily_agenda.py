@@ -15,22 +15,58 @@
 
 CONFIG_FILE_DEFAULT = "/etc/pi-e-ink-daily.defaults.json"
 CONFIG_FILE         = "/etc/pi-e-ink-daily.json"
+SNAPSHOT_DIR        = "/var/cache/pi-e-ink-daily"
+
+import sys
+from Timing import PhaseTimer
+
+# the imports of the program are timed as well (arguments are parsed later)
+if any(arg.split("=")[0] in ["--import-report","--import-budget"]
+                                                      for arg in sys.argv[1:]):
+  PhaseTimer.shared().start_import_timing()
 
 import traceback
 
 # --- system-imports   -------------------------------------------------------
 
 import argparse
-import sys, os, datetime, locale, json
+import os, datetime, locale, json, hashlib, threading, signal, tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from CacheFile       import CacheFile
+from ConfigCompiler  import ConfigCompiler, ConfigError
+from ContentProvider import ContentProvider
+from Probe           import Probe
+from RunLog          import RunLog
+
+# heavy modules are imported on first use
+Image          = None
+ImageDraw      = None
+inky_available = False
+
+# --- import PIL   -----------------------------------------------------------
+
+def import_pil():
+  """ import PIL-modules (global) """
 
-from PIL import Image, ImageDraw, ImageFont
+  global Image, ImageDraw
+  if not Image:
+    from PIL import Image, ImageDraw
 
-try:
-  from inky.auto import auto
-  inky_available = True
-except Exception:
-  # traceback.print_exc()
-  inky_available = False
+# --- import inky   ----------------------------------------------------------
+
+def import_inky():
+  """ import inky, return auto-function or None """
+
+  global inky_available
+  try:
+    from inky.auto import auto
+    inky_available = True
+    return auto
+  except Exception:
+    # traceback.print_exc()
+    inky_available = False
+    return None
 
 # ----------------------------------------------------------------------------
 # --- helper class to convert a dict to an object   --------------------------
@@ -48,14 +84,105 @@ class DailyAgenda(object):
   RC_OK        = 0
   RC_NO_UPDATE = 2
   RC_FAIL      = 3
+  RC_UNCHANGED = 4
+
+  FRAME_CACHE  = "frame.json"
+  STATIC_CACHE = "static"
+
+  # nominal colors of the display
+  RGB = {
+    'WHITE' : (255,255,255),
+    'BLACK' : (0,0,0),
+    'GRAY'  : (192,192,192),
+    'RED'   : (255,0,0),
+    'YELLOW': (255,255,0),
+    'GREEN' : (0,128,0),
+    'BLUE'  : (0,0,255),
+    'ORANGE': (255,165,0)
+    }
 
   # --- constructor   --------------------------------------------------------
 
-  def __init__(self):
+  def __init__(self,headless=False,config_file=None,now=None,prefetch=True):
+    """ create screen. Arguments:
+
+          headless:    don't use the display
+          config_file: configuration-file (default: CONFIG_FILE)
+          now:         fixed time (datetime) used for rendering
+          prefetch:    start fetching data immediately
+    """
+
+    self.timer = PhaseTimer.shared()
+    self._now  = now
+
+    # read settings (compiled and validated, raises ConfigError)
+    with self.timer.phase("config"):
+      opts = get_compiler(config_file).compile()
+      self._layout = get_layout(opts)
+      self.providers = [get_content_provider(entry["provider"],self)
+                                                  for entry in self._layout]
+      self.provider  = self.providers[0]
+      self._opts = Options(opts)          # convert to attributes
+
+      # every provider can override options
+      for provider,entry in zip(self.providers,self._layout):
+        if "options" in entry:
+          provider.set_options(Options(dict(opts,**entry["options"])))
+        else:
+          provider.set_options(self._opts)
+
+    # application objects
+    self._headless  = headless
+    self._http_pool = None
+    self._http_lock = threading.Lock()
+    self._gpio      = None
+    self._quantizer = None
+    self._probe     = None
+
+    # start fetching data as early as possible: network I/O overlaps
+    # the setup of the display, the GPIOs, the fonts and the canvas
+    self._reset_state()
+    self._fetch_thread = None
+    if prefetch:
+      self.start_fetch()
+
+    self._init_display(headless)
+    with self.timer.phase("config"):
+      self._finish_options()
+
+    # path to images
+    pgm_dir = os.path.dirname(os.path.realpath(__file__))
+    img_dir = os.path.realpath(os.path.join(pgm_dir,"..",
+                                            "share","pi-e-ink-daily"))
+    self.NO_CONNECT = os.path.join(img_dir,self._opts.no_server_connection)
+    self.NO_EVENTS  = os.path.join(img_dir,self._opts.no_events)
+
+    with self.timer.phase("gpio"):
+      self._init_gpio()
+
+    # drawing objects
+    with self.timer.phase("canvas"):
+      import_pil()
+      from FontPool    import FontPool
+      from TextMeasure import TextMeasure
+      self.fonts   = FontPool.shared()     # fonts are loaded on first use
+      self.measure = TextMeasure.shared()  # cached text-sizes
+      for provider in self.providers:
+        provider.create_fonts()
+    self._create_canvas()
+
+  # --- initialize display   -------------------------------------------------
+
+  def _init_display(self,headless):
+    """ initialize display (or simulated display) """
+
     global inky_available
+    with self.timer.phase("display"):
+      auto = None if headless else import_inky()
     if inky_available:
       try:
-        self._display = auto()
+        with self.timer.phase("display"):
+          self._display = auto()
         if self._display.colour != "multi":
           self._display.GRAY   = self._display.RED
           self._display.GREEN  = self._display.RED
@@ -67,68 +194,230 @@ class DailyAgenda(object):
         inky_available = False    # only the lib is available
 
     if not inky_available:
-      self._display = Options( {
-        'WHITE' : (255,255,255),
-        'BLACK' : (0,0,0),
-        'GRAY'  : (192,192,192),
-        'RED'   : (255,0,0),
-        'YELLOW': (255,255,0),
-        'GREEN' : (0,128,0),
-        'BLUE'  : (0,0,255),
-        'ORANGE': (255,165,0)
-        })
-
-    # read settings. This has to be done twice: the first
-    # time to query the content-provider, the second time
-    # to overwrite default settings of content-provider
-    opts = {}
-    self._read_settings(opts)
-    self._get_content_provider(opts["content_provider"])
-    self.provider.read_settings(opts)
-    self._read_settings(opts)
-    self._opts = Options(opts)          # convert to attributes
-    self.provider.set_options(self._opts)
+      self._display = Options(dict(DailyAgenda.RGB))
 
-    # drawing objects
-    self._create_color_maps()            # create color-maps
-    self._map_colors()
-    self._create_fonts()
-    self.provider.create_fonts()
+  # --- complete options with values of the display   -----------------------
 
-    # path to images
-    pgm_dir = os.path.dirname(os.path.realpath(__file__))
-    img_dir = os.path.realpath(os.path.join(pgm_dir,"..",
-                                            "share","pi-e-ink-daily"))
-    self.NO_CONNECT = os.path.join(img_dir,self._opts.no_server_connection)
-    self.NO_EVENTS  = os.path.join(img_dir,self._opts.no_events)
+  def _finish_options(self):
+    """ set size of display and map colors of all options-objects """
 
+    self._create_color_maps()            # create color-maps
+    all_opts = [self._opts] + [provider.opts for provider in self.providers
+                                       if provider.opts is not self._opts]
+    for opts in all_opts:
+      if inky_available:
+        opts.WIDTH=self._display.width
+        opts.HEIGHT=self._display.height
+      self._map_colors(vars(opts))        # in place: fetch might be running
 
-    # application objects
-    if inky_available:
-      self._opts.WIDTH=self._display.width
-      self._opts.HEIGHT=self._display.height
+  # --- setup GPIOs   --------------------------------------------------------
 
-      self._image  = Image.new("P",
-                             (self._opts.WIDTH,self._opts.HEIGHT),
-                             color=self._opts.BORDER_COLOR)
+  def _init_gpio(self):
+    """ setup GPIO for battery-info """
+
+    if not inky_available:
+      return
+    import RPi.GPIO as GPIO
+    GPIO.setmode(GPIO.BCM)
+    if self._opts.BAT_OK_VALUE:
+      pull = GPIO.PUD_UP
     else:
-      self._image  = Image.new("RGB",
-                             (self._opts.WIDTH,self._opts.HEIGHT),
-                             color=self._opts.BORDER_COLOR)
+      pull = GPIO.PUD_DOWN
+    GPIO.setup(self._opts.BAT_GPIO,GPIO.IN,pull_up_down=pull)
+    self._gpio = GPIO
+
+  # --- reset screen for a new update   --------------------------------------
+
+  def reset(self):
+    """ create a new (empty) frame and start fetching new data """
+
+    self._reset_state()
+    self.start_fetch()
+    self._create_canvas()
+
+  # --- reset state of frame   -----------------------------------------------
+
+  def _reset_state(self):
+    """ reset state of the frame """
 
-    self._canvas = ImageDraw.Draw(self._image)
-    self.provider.set_canvas(self._canvas)
     self._y_off  = 0
+    self._data_time = None                        # time of stale data
+    self._fingerprint = None                      # hash of frame-content
+    self._refreshed = False                       # display was refreshed
+    self._battery = None                          # state of battery-GPIO
     self.rc = DailyAgenda.RC_OK                   # return-code
 
-  # --- load content provider   ----------------------------------------------
+  # --- create image and canvas   --------------------------------------------
+
+  def _create_canvas(self):
+    """ create image and canvas """
+
+    with self.timer.phase("canvas"):
+      if inky_available:
+        self._image  = Image.new("P",
+                               (self._opts.WIDTH,self._opts.HEIGHT),
+                               color=self._opts.BORDER_COLOR)
+      else:
+        self._image  = Image.new("RGB",
+                               (self._opts.WIDTH,self._opts.HEIGHT),
+                               color=self._opts.BORDER_COLOR)
+      self._canvas = ImageDraw.Draw(self._image)
+
+  # --- fetch data in the background   ---------------------------------------
+
+  def start_fetch(self):
+    """ start fetching the data of all providers in a background-thread """
+
+    if self._opts.probe_deadline > 0:
+      self._probe = Probe(self.get_hosts(),
+                          deadline=self._opts.probe_deadline).start()
+    def fetch():
+      with self.timer.phase("fetch-io"):
+        self._fetch_content()
+    self._fetch_thread = threading.Thread(target=fetch,daemon=True)
+    self._fetch_thread.start()
+
+  # --- wait for data   ------------------------------------------------------
+
+  def wait_fetch(self):
+    """ wait until the data of all providers is available """
+
+    if self._fetch_thread:
+      self._fetch_thread.join()
+      self._fetch_thread = None
+
+  # --- update display   -----------------------------------------------------
+
+  def update(self,output=None):
+    """ render a complete frame and show it """
+
+    try:
+      with self.timer.phase("static"):
+        self.draw_static()
+
+      with self.timer.phase("fetch"):
+        self.wait_fetch()               # blocks only if data is missing
+      with self.timer.phase("content"):
+        for provider,region in zip(self.providers,self._get_regions()):
+          provider.render(self._canvas,region)
+      if self.rc != DailyAgenda.RC_NO_UPDATE:
+        with self.timer.phase("status"):
+          self.draw_status()
+        with self.timer.phase("show"):
+          self.show(output)
+    finally:
+      self.log_run()
+
+  # --- log timing and statistics of the run   -------------------------------
+
+  def log_run(self):
+    """ append a record with timings and statistics to the run-log """
+
+    if not self._opts.run_log:
+      return
+    record = {
+      "time":      datetime.datetime.now().isoformat(timespec="seconds"),
+      "elapsed":   round(self.timer.get_elapsed(),4),
+      "uptime":    self._get_uptime(),
+      "phases":    {name: round(duration,4)
+                              for name,duration in self.timer.phases.items()},
+      "refreshed": self._refreshed,
+      "battery":   self._battery,
+      "rc":        self.rc
+      }
+    if self._http_pool:
+      stats = self._http_pool.get_stats()
+      self._http_pool.reset_stats()
+      record.update({"http_requests":  stats["requests"],
+                     "http_bytes_in":  stats["bytes_in"],
+                     "http_bytes_out": stats["bytes_out"]})
+
+    RunLog(self.get_cache_path(self._opts.run_log),
+           max_size=self._opts.run_log_size,
+           backups=self._opts.run_log_backups).append(record)
+
+  # --- time since boot   ----------------------------------------------------
+
+  def _get_uptime(self):
+    """ return seconds since boot (None if not available) """
+
+    try:
+      with open("/proc/uptime","r") as f:
+        return float(f.read().split()[0])
+    except Exception:
+      return None
 
-  def _get_content_provider(self,provider_class):
-    """ load content provider """
+  # --- time of next update   ------------------------------------------------
 
-    mod = __import__(provider_class)
-    klass = getattr(mod,provider_class)
-    self.provider = klass(self)
+  def get_next_update(self,interval):
+    """ return time of next update: after interval (seconds), at the next
+        change of the content or at midnight (whatever comes first) """
+
+    now  = self.now()
+    next = now + datetime.timedelta(seconds=interval)
+
+    midnight = datetime.datetime.combine(now.date()+datetime.timedelta(days=1),
+                                         datetime.time.min)
+    changes = [provider.get_next_change() for provider in self.providers]
+    for t in [midnight] + changes:
+      if t and now < t < next:
+        next = t
+    return next
+
+  # --- program wake-up of the RTC   -----------------------------------------
+
+  def set_wakealarm(self):
+    """ program the RTC (rtc_wakealarm) to wake up the system for the
+        next update. Called before the system is powered off.
+        Returns the time of the alarm (timestamp) or None. """
+
+    path = self._opts.rtc_wakealarm
+    if not path:
+      return None
+
+    next  = self.get_next_update(60*self._opts.rtc_interval)
+    alarm = int(next.timestamp() + self._opts.rtc_delay)
+    try:
+      # an active alarm must be cleared before a new alarm is accepted
+      with open(path,"w") as f:
+        f.write("0\n")
+      with open(path,"w") as f:
+        f.write("%d\n" % alarm)
+      return alarm
+    except Exception:
+      traceback.print_exc()
+      return None
+
+  # --- fetch data of all providers   ----------------------------------------
+
+  def _fetch_content(self):
+    """ fetch data of all providers concurrently """
+
+    if len(self.providers) == 1:
+      self.provider.fetch()
+      return
+    with ThreadPoolExecutor(max_workers=len(self.providers)) as executor:
+      for provider in self.providers:
+        executor.submit(provider.fetch)
+
+  # --- regions of the providers   -------------------------------------------
+
+  def _get_regions(self):
+    """ return regions (x,y,width,height) of all providers.
+
+        The layout defines regions in percent of the content-area (between
+        day-box and status-line).
+    """
+
+    y0     = self._y_off
+    width  = self._opts.WIDTH
+    height = self._opts.HEIGHT - self._opts.HEIGHT_S - y0
+    regions = []
+    for entry in self._layout:
+      x,y,w,h = entry.get("region",[0,0,100,100])
+      regions.append((int(width*x/100),y0+int(height*y/100),
+                      int(width*w/100),int(height*h/100)))
+    return regions
 
   # --- create color-maps   --------------------------------------------------
 
@@ -158,24 +447,117 @@ class DailyAgenda(object):
       self._display.ORANGE: self._display.BLACK,
       }
 
-  # --- read settings from config-file   -------------------------------------
+  # --- current time   -------------------------------------------------------
+
+  def now(self):
+    """ return current time (or the fixed time of the screen) """
+
+    return self._now or datetime.datetime.now()
+
+  # --- register time of stale data   ----------------------------------------
+
+  def set_data_time(self,data_time):
+    """ set time of (stale) data used for rendering, keep the oldest """
 
-  def _read_settings(self,opts):
-    """ read settings from /etc/pi-e-ink-daily.json """
+    if self._data_time is None or data_time < self._data_time:
+      self._data_time = data_time
 
-    if os.path.exists(CONFIG_FILE_DEFAULT):
-      with open(CONFIG_FILE_DEFAULT,"r") as f:
-        opts.update(json.load(f))
-    if os.path.exists(CONFIG_FILE):
-      with open(CONFIG_FILE,"r") as f:
-        opts.update(json.load(f))
+  # --- format age of stale data   --------------------------------------------
+
+  def _get_data_age(self):
+    """ return age of stale data as human-readable string """
+
+    age = int(max(0,self.now().timestamp()-self._data_time)/60)
+    if age < 60:
+      return "%dm" % age
+    elif age < 24*60:
+      return "%dh" % int(age/60)
+    else:
+      return "%dd" % int(age/(24*60))
+
+  # --- return shared http-session   -----------------------------------------
+
+  def get_http_session(self):
+    """ return run-scoped http-session (requests.Session) """
+
+    with self._http_lock:
+      if not self._http_pool:
+        from HttpPool import HttpPool
+        self._http_pool = HttpPool(timeout=self._opts.http_timeout,
+                                   pool_size=self._opts.http_pool_size,
+                                   tls_resume=self._opts.http_tls_resume)
+      return self._http_pool.session
+
+  # --- release resources   --------------------------------------------------
+
+  def close(self):
+    """ close the connections of the http-session """
+
+    with self._http_lock:
+      if self._http_pool:
+        self._http_pool.close()
+        self._http_pool = None
+
+  # --- hosts of all providers   ---------------------------------------------
+
+  def get_hosts(self):
+    """ return list of (host,port) needed by the providers """
+
+    return [Probe.get_host(url) for provider in self.providers
+                                            for url in provider.get_urls()]
+
+  # --- wait until a host is available   -------------------------------------
+
+  def wait_host(self,url):
+    """ wait until the host of the url is reachable (or the probe gave up) """
+
+    if self._probe:
+      return self._probe.wait(Probe.get_host(url))
+    return True
+
+  # --- return quantizer for the palette of the display   --------------------
+
+  @property
+  def quantizer(self):
+    """ quantizer mapping RGB to the palette of the display (on first use) """
+
+    if not self._quantizer:
+      from Quantizer import Quantizer
+      self._quantizer = Quantizer(self._get_palette(),
+                                  cache_dir=self._opts.cache_dir,
+                                  dither=self._opts.image_dither)
+    return self._quantizer
+
+  # --- palette of the display   ---------------------------------------------
+
+  def _get_palette(self):
+    """ return palette (index -> (r,g,b)) from the display-constants """
+
+    names = ["WHITE","BLACK","RED","YELLOW","GREEN","BLUE","ORANGE"]
+    if getattr(self._display,"colour",None) == "yellow":
+      names.remove("YELLOW")
+      names.insert(2,"YELLOW")        # RED and YELLOW share the same index
+    palette = {}
+    for name in names:
+      value = getattr(self._display,name)
+      if inky_available:
+        palette.setdefault(value,DailyAgenda.RGB[name])
+      else:
+        palette.setdefault(len(palette),value)
+    return palette
+
+  # --- return path of a cache-file   ----------------------------------------
+
+  def get_cache_path(self,name):
+    """ return path of a cache-file within the cache-directory """
+
+    return os.path.join(self._opts.cache_dir,name)
 
   # --- create color-maps   --------------------------------------------------
 
-  def _map_colors(self):
-    """ map colors """
+  def _map_colors(self,options):
+    """ map colors (options is a dict) """
 
-    options = vars(self._opts)
     for opt in options:
       if '_COLOR' in opt:
         key = options[opt]
@@ -184,26 +566,32 @@ class DailyAgenda(object):
         else:
           options[opt] = self._cmap['black']
 
-  # --- create fonts   -----------------------------------------------------
+  # --- fonts (loaded on first use)   ---------------------------------------
+
+  @property
+  def _title_font(self):
+    return self.fonts.get(self._opts.TITLE_FONT,self._opts.TITLE_SIZE)
+
+  @property
+  def _day_font(self):
+    return self.fonts.get(self._opts.DAY_FONT,self._opts.DAY_SIZE)
 
-  def _create_fonts(self):
-    """ create fonts """
+  @property
+  def _text_font(self):
+    return self.fonts.get(self._opts.TEXT_FONT,self._opts.TEXT_SIZE)
 
-    self._title_font  = ImageFont.truetype(self._opts.TITLE_FONT,
-                                          self._opts.TITLE_SIZE)
-    self._day_font    = ImageFont.truetype(self._opts.DAY_FONT,
-                                          self._opts.DAY_SIZE)
-    self._text_font   = ImageFont.truetype(self._opts.TEXT_FONT,
-                                          self._opts.TEXT_SIZE)
-    self._status_font = ImageFont.truetype(self._opts.STATUS_FONT,
-                                          self._opts.STATUS_SIZE)
+  @property
+  def _status_font(self):
+    return self.fonts.get(self._opts.STATUS_FONT,self._opts.STATUS_SIZE)
 
   # --- draw a line   ------------------------------------------------------
 
-  def _draw_hline(self,y):
+  def _draw_hline(self,y,x0=0,x1=None):
     """ draw a horizontal line """
 
-    self._canvas.line([(0,y),(self._opts.WIDTH,y)],
+    if x1 is None:
+      x1 = self._opts.WIDTH
+    self._canvas.line([(x0,y),(x1,y)],
                                   fill=self._opts.LINE_COLOR,width=1)
 
   # --- main title   -------------------------------------------------------
@@ -212,9 +600,9 @@ class DailyAgenda(object):
     """ Draw title """
 
     if self._opts.TITLE:
-      title = datetime.datetime.now().strftime(self._opts.TITLE)
+      title = self.now().strftime(self._opts.TITLE)
     else:
-      title = datetime.datetime.now().strftime("%B")  # month
+      title = self.now().strftime("%B")  # month
 
     self._canvas.text((20,20),title,
                       font=self._title_font,
@@ -225,14 +613,14 @@ class DailyAgenda(object):
   def draw_day(self):
     """ draw box with current day of the month """
 
-    day         = str(datetime.date.today().day)
-    day_size    = self._canvas.textsize(day,self._day_font,spacing=0)
+    day         = str(self.now().day)
+    day_size    = self.measure.size(self._day_font,day)
     day_topleft = (self._opts.WIDTH-day_size[0]-self._opts.MARGINS[0],0)
     day_box_y   = day_size[1]+2*self._opts.MARGINS[3]+1
     day_box     = [day_topleft[0]-self._opts.MARGINS[0],0,
                    self._opts.WIDTH+1,day_box_y]
 
-    if datetime.date.today().weekday() == 6:
+    if self.now().weekday() == 6:
       self._canvas.rectangle(day_box,fill=self._opts.DAY_COLOR_BG7)
     else:
       self._canvas.rectangle(day_box,fill=self._opts.DAY_COLOR_BG)
@@ -243,19 +631,85 @@ class DailyAgenda(object):
     # update global y offset
     self._y_off = day_box_y + 2
 
+  # --- static parts of the frame   -----------------------------------------
+
+  def draw_static(self):
+    """ draw title, day-box and separator of status-line.
+
+        These parts only change once per day, so they are rendered once
+        and then copied from a cached base-image.
+    """
+
+    if self._opts.TITLE:
+      title = self.now().strftime(self._opts.TITLE)
+    else:
+      title = self.now().strftime("%B")  # month
+    key = hashlib.sha1(json.dumps([self.now().date().isoformat(),title,
+                                   self._image.mode,self._image.size,
+                                   vars(self._opts)],
+                                  sort_keys=True,default=str).encode()
+                       ).hexdigest()
+
+    # the key is part of the image (single atomic update of the cache)
+    png_file = self.get_cache_path(DailyAgenda.STATIC_CACHE+".png")
+    if self._opts.cache_static:
+      try:
+        with Image.open(png_file) as base:
+          if (base.info.get("key",None) == key and
+              base.mode == self._image.mode and base.size == self._image.size):
+            self._image.paste(base)
+            self._y_off = int(base.info["y_off"])
+            return
+      except Exception:
+        pass
+
+    # render and save static layer
+    self.draw_title()
+    self.draw_day()
+    self._draw_hline(self._opts.HEIGHT - self._opts.HEIGHT_S)
+    if self._opts.cache_static:
+      tmp_file = None
+      try:
+        from PIL.PngImagePlugin import PngInfo
+        info = PngInfo()
+        info.add_text("key",key)
+        info.add_text("y_off",str(self._y_off))
+        os.makedirs(self._opts.cache_dir,exist_ok=True)
+        fd, tmp_file = tempfile.mkstemp(dir=self._opts.cache_dir,
+                                        prefix=".static-")
+        with os.fdopen(fd,"wb") as f:
+          self._image.save(f,format="PNG",compress_level=1,pnginfo=info)
+        os.replace(tmp_file,png_file)
+      except Exception:
+        if tmp_file:
+          try:
+            os.unlink(tmp_file)
+          except Exception:
+            pass
+
   # --- overlay image   -----------------------------------------------------
 
-  def draw_image(self,path):
-    """ draw image """
+  def draw_image(self,path,region=None):
+    """ draw image centered within region (default: content-area) """
 
-    # load image
+    if not region:
+      region = (0,self._y_off,self._opts.WIDTH,
+                self._opts.HEIGHT-self._opts.HEIGHT_S-self._y_off)
+
+    # load image and map it to the palette of the display
     try:
       image = Image.open(path)
-      x_off = int((self._opts.WIDTH - image.width)/2)
-      y_off = self._y_off + int((self._opts.HEIGHT - self._y_off -
-               self._opts.HEIGHT_S - image.height)/2)
-      self._image.paste(image,box=(x_off,y_off))
+      if "A" in image.getbands():
+        mask = image.getchannel("A")
+      else:
+        mask = None
+      x_off = region[0] + int((region[2] - image.width)/2)
+      y_off = region[1] + int((region[3] - image.height)/2)
+      native = self.quantizer.quantize(image)
       image.close()
+      if self._image.mode != "P":
+        native = native.convert(self._image.mode)
+      self._image.paste(native,box=(x_off,y_off),mask=mask)
     except:
       traceback.print_exc()
       return
@@ -268,24 +722,11 @@ class DailyAgenda(object):
     status_y = self._opts.HEIGHT - self._opts.HEIGHT_S
     self._draw_hline(status_y)
 
-    # update-info
-    status_text = "Updated: %s" % datetime.datetime.now().strftime("%x %X")
-    self._canvas.text((self._opts.MARGINS[2],status_y),
-                      status_text,
-                      font=self._status_font,
-                      fill=self._opts.STATUS_COLOR)
-
     # battery-info
-    if inky_available:
-      import RPi.GPIO as GPIO
-      GPIO.setmode(GPIO.BCM)
-      if self._opts.BAT_OK_VALUE:
-        pull = GPIO.PUD_UP
-      else:
-        pull = GPIO.PUD_DOWN
-      GPIO.setup(self._opts.BAT_GPIO,GPIO.IN,pull_up_down=pull)
-
-      if GPIO.input(self._opts.BAT_GPIO) == self._opts.BAT_OK_VALUE:
+    if self._gpio:
+      self._battery = (
+        self._gpio.input(self._opts.BAT_GPIO) == self._opts.BAT_OK_VALUE)
+      if self._battery:
         bat_text  = self._opts.BAT_OK_TEXT
         bat_color = self._opts.BAT_OK_COLOR
       else:
@@ -300,23 +741,90 @@ class DailyAgenda(object):
         bat_text  = self._opts.BAT_LOW_TEXT
         bat_color = self._opts.BAT_LOW_COLOR
 
-    bat_size  = self._canvas.textsize(bat_text,self._status_font,spacing=0)
-    self._canvas.text((self._opts.WIDTH-self._opts.MARGINS[3]-bat_size[0],
-                       status_y),
+    bat_x = self.measure.right(self._status_font,bat_text,
+                               self._opts.WIDTH-self._opts.MARGINS[3])
+    self._canvas.text((bat_x,status_y),
                       bat_text,
                       font=self._status_font,
                       fill=bat_color)
 
+    # everything except the update-info is part of the fingerprint
+    self._fingerprint = self._get_fingerprint()
+
+    # update-info
+    status_text = "Updated: %s" % self.now().strftime("%x %X")
+    if self._data_time is not None:
+      status_text += self._opts.STALE_TEXT.format(self._get_data_age())
+    self._canvas.text((self._opts.MARGINS[2],status_y),
+                      status_text,
+                      font=self._status_font,
+                      fill=self._opts.STATUS_COLOR)
+
+  # --- fingerprint of current frame   ---------------------------------------
+
+  def _get_fingerprint(self):
+    """ return hash of the current frame """
+
+    fp = hashlib.sha1()
+    fp.update(("%s:%r:%r:" % (self._image.mode,self._image.size,
+                              self._opts.BORDER_COLOR)).encode())
+    fp.update(self._image.tobytes())
+    return fp.hexdigest()
+
+  # --- check if frame changed   ---------------------------------------------
+
+  def _frame_changed(self):
+    """ compare fingerprint with fingerprint of the last frame shown """
+
+    if not self._opts.skip_unchanged or self._fingerprint is None:
+      return True
+    cache = CacheFile(self.get_cache_path(DailyAgenda.FRAME_CACHE))
+    return cache.load().get("fingerprint",None) != self._fingerprint
+
+  # --- save fingerprint of frame shown   ------------------------------------
+
+  def _save_fingerprint(self):
+    """ save fingerprint of the frame shown """
+
+    if self._fingerprint is not None:
+      cache = CacheFile(self.get_cache_path(DailyAgenda.FRAME_CACHE))
+      cache.save({"fingerprint": self._fingerprint})
+
+  # --- native buffer   ------------------------------------------------------
+
+  def get_buffer(self):
+    """ return frame as palette-indices (one byte per pixel) """
+
+    if self._image.mode == "P":
+      return self._image.tobytes()
+    return self.quantizer.quantize(self._image).tobytes()
+
   # --- show image   ---------------------------------------------------------
 
-  def show(self):
-    """ show current screen on device """
+  def show(self,output=None):
+    """ show current screen on device (and save it to output) """
+
+    if output:
+      self._image.save(output)
+    if self._headless:
+      return
+
+    if not self._frame_changed():
+      # skip the (slow) refresh of the display (keep errors of this run)
+      if self.rc == DailyAgenda.RC_OK:
+        self.rc = DailyAgenda.RC_UNCHANGED
+      return
 
     if inky_available:
       try:
+        if self._image.mode != "P":
+          # native buffer: the display must not convert the image itself
+          self._image = self.quantizer.quantize(self._image)
         self._display.set_border(self._opts.BORDER_COLOR)
         self._display.set_image(self._image)
         self._display.show()
+        self._refreshed = True
+        self._save_fingerprint()
       except:
         traceback.print_exc()
         self.rc = 3
@@ -324,23 +832,176 @@ class DailyAgenda(object):
 
     # fallback to direct display using PIL default viewer
     self._image.show()
+    self._refreshed = True
+    self._save_fingerprint()
+
+# --- compiler for the configuration   ---------------------------------------
+
+def get_compiler(config_file=None):
+  """ return compiler for /etc/pi-e-ink-daily.json (or config_file) """
+
+  return ConfigCompiler(CONFIG_FILE_DEFAULT,config_file or CONFIG_FILE,
+                        ContentProvider.CONFIG_FILE_DEFAULT,SNAPSHOT_DIR)
+
+# --- layout of the screen   -------------------------------------------------
+
+def get_layout(opts):
+  """ return list of layout-entries (provider and options) of the
+      compiled configuration """
+
+  return opts.get("layout",None) or [{"provider": opts["content_provider"]}]
+
+# --- load content provider   ------------------------------------------------
+
+def get_content_provider(provider_class,screen):
+  """ load content provider """
+
+  mod = __import__(provider_class)
+  klass = getattr(mod,provider_class)
+  return klass(screen)
+
+# --- hosts of a configuration   ---------------------------------------------
+
+def get_hosts(opts):
+  """ return list of (host,port) needed by the providers of the compiled
+      configuration (without a screen, i.e. without display and fonts) """
+
+  hosts = []
+  for entry in get_layout(opts):
+    provider = get_content_provider(entry["provider"],None)
+    provider.set_options(Options(dict(opts,**entry.get("options",{}))))
+    hosts.extend(Probe.get_host(url) for url in provider.get_urls())
+  return hosts
+
+# --- create screen   --------------------------------------------------------
+
+def create_screen(**kwargs):
+  """ create screen, exit for invalid configurations """
+
+  try:
+    return DailyAgenda(**kwargs)
+  except ConfigError as e:
+    print(e,file=sys.stderr)
+    sys.exit(DailyAgenda.RC_FAIL)
+
+# --- command-line parser   --------------------------------------------------
+
+def get_parser():
+  """ create command-line parser """
+
+  parser = argparse.ArgumentParser(
+    description="update e-ink display with daily agenda")
+  parser.add_argument("--daemon",action="store_true",
+                      help="keep running and update display on schedule")
+  parser.add_argument("--headless",action="store_true",
+                      help="don't use the display (no inky, no GPIO)")
+  parser.add_argument("-o","--output",metavar="file",
+                      help="save rendered image to file")
+  parser.add_argument("--import-report",action="store_true",
+                      help="print import-times per phase to stderr")
+  parser.add_argument("--import-budget",metavar="ms",type=float,
+                      help="fail if the total import-time exceeds budget")
+  parser.add_argument("--check-config",action="store_true",
+                      help="validate the configuration and exit")
+  parser.add_argument("--stats",action="store_true",
+                      help="print summary of the run-log and exit")
+  parser.add_argument("--probe",metavar="s",nargs="?",type=float,const=0,
+                      help="check network-availability of all hosts and exit "
+                      "(deadline in seconds, default: probe_deadline)")
+  return parser
+
+# --- daemon mode   ----------------------------------------------------------
+
+def run_daemon(args):
+  """ keep running and update the display on schedule """
+
+  wakeup = threading.Event()
+  reload = [False]
+  def on_sighup(signum,frame):
+    reload[0] = True
+    wakeup.set()
+  signal.signal(signal.SIGHUP,on_sighup)
+
+  screen = create_screen(headless=args.headless)
+  while True:
+    try:
+      screen.update(args.output)
+    except Exception:
+      traceback.print_exc()
+
+    # wait for next update (a bit after the change of the content)
+    next = screen.get_next_update(60*screen._opts.daemon_interval)
+    delay = ((next - datetime.datetime.now()).total_seconds() +
+                                               screen._opts.daemon_delay)
+    wakeup.wait(max(1,delay))
+    wakeup.clear()
+    screen.timer.reset_phases()            # timings per update
+
+    if reload[0]:
+      reload[0] = False
+      try:
+        new_screen = DailyAgenda(headless=args.headless)
+        screen.close()                     # release connections of old pool
+        screen = new_screen
+        continue
+      except Exception:
+        traceback.print_exc()              # keep old configuration
+    screen.reset()
 
 # --- main program   ----------------------------------------------------------
 
 if __name__ == '__main__':
+  args  = get_parser().parse_args()
+  timer = PhaseTimer.shared()
   locale.setlocale(locale.LC_ALL, '')
 
-  screen = DailyAgenda()
-  screen.draw_title()
-  screen.draw_day()
+  if args.check_config:
+    try:
+      get_compiler().compile()
+    except ConfigError as e:
+      print(e,file=sys.stderr)
+      sys.exit(DailyAgenda.RC_FAIL)
+    print("configuration ok")
+    sys.exit(0)
 
-  screen.provider.draw_content()
-  if screen.rc != DailyAgenda.RC_NO_UPDATE:
-    screen.draw_status()
-    screen.show()
-  if screen._opts.no_shutdown_on_error and screen.rc > DailyAgend.RC_OK:
+  if args.stats:
+    opts = get_compiler().compile()
+    print(RunLog(os.path.join(opts["cache_dir"],opts["run_log"]),
+                 backups=opts["run_log_backups"]).get_summary())
+    sys.exit(0)
+
+  if args.probe is not None:
+    try:
+      opts = get_compiler().compile()
+    except ConfigError as e:
+      print(e,file=sys.stderr)
+      sys.exit(DailyAgenda.RC_FAIL)
+    deadline = args.probe or opts["probe_deadline"]
+    result   = Probe(get_hosts(opts),deadline=deadline).start().wait_all()
+    for (host,port),ok in result.items():
+      print("%s:%d: %s" % (host,port,"ok" if ok else "not available"))
+    sys.exit(0 if all(result.values()) else 1)
+
+  if args.daemon:
+    run_daemon(args)
+
+  screen = create_screen(headless=args.headless)
+  screen.update(args.output)
+
+  if args.import_report:
+    print(timer.get_import_report(),file=sys.stderr)
+  if args.import_budget:
+    import_ms = 1000*timer.get_import_time()
+    if import_ms > args.import_budget:
+      print("import-time %.1f ms exceeds budget of %.1f ms" %
+            (import_ms,args.import_budget),file=sys.stderr)
+      sys.exit(DailyAgenda.RC_FAIL)
+
+  if (screen._opts.no_shutdown_on_error and
+      screen.rc not in [DailyAgenda.RC_OK,DailyAgenda.RC_UNCHANGED]):
     sys.exit(screen.rc)
   elif screen._opts.auto_shutdown:
+    screen.set_wakealarm()
     sys.exit(0)
   else:
     sys.exit(1)
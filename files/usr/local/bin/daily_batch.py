@@ -0,0 +1,125 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# pi-e-ink-daily: render frames for many configurations (headless)
+#
+# Data is fetched once for all frames sharing the same source (e.g. the
+# same calendars or the same location), rendering runs in a pool of
+# processes (fonts are loaded once per process).
+#
+# Usage: daily_batch.py [-t time ...] [-d dir] [-f png|native] [-w n] config...
+#
+# Author: Bernhard Bablok
+# License: GPL3
+#
+# Website: https://github.com/bablokb/pi-e-ink-daily
+#
+# ----------------------------------------------------------------------------
+
+import argparse
+import sys, os, datetime, locale, traceback
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from daily_agenda import DailyAgenda
+
+# --- render a single frame (executed in a worker-process)   -----------------
+
+def render_frame(job):
+  """ render frame with shared data, return (output,rc) """
+
+  screen = DailyAgenda(headless=True,config_file=job["config"],
+                       now=job["now"],prefetch=False)
+  screen._opts.run_log = ""                 # not a run of the frame
+  for provider in screen.providers:
+    key = provider.get_data_key()
+    if key in job["data"]:
+      provider.set_data(job["data"][key])   # else: fetched while rendering
+
+  if job["format"] == "png":
+    screen.update(job["output"])
+  else:
+    screen.update()
+    with open(job["output"],"wb") as f:
+      f.write(screen.get_buffer())
+  return (job["output"],screen.rc)
+
+# --- fetch shared data   ----------------------------------------------------
+
+def fetch_shared(jobs):
+  """ fetch data of all distinct sources once and add it to the jobs """
+
+  # earliest frame first, so the data covers all frames of the same day
+  providers = {}
+  for job in sorted(jobs,key=lambda job: job["now"]):
+    screen = DailyAgenda(headless=True,config_file=job["config"],
+                         now=job["now"],prefetch=False)
+    job["keys"] = []
+    for provider in screen.providers:
+      key = provider.get_data_key()
+      if key is not None:
+        job["keys"].append(key)
+        providers.setdefault(key,provider)
+
+  with ThreadPoolExecutor(max_workers=max(1,len(providers))) as executor:
+    for provider in providers.values():
+      executor.submit(provider.fetch)
+
+  shared = {key: provider.get_data() for key,provider in providers.items()}
+  for job in jobs:
+    job["data"] = {key: shared[key] for key in job.pop("keys")}
+
+# --- command-line parser   --------------------------------------------------
+
+def get_parser():
+  """ create command-line parser """
+
+  parser = argparse.ArgumentParser(
+    description="render frames for many configurations")
+  parser.add_argument("-t","--time",metavar="time",action="append",
+                      type=datetime.datetime.fromisoformat,
+                      help="render frames for time (ISO-format, default: now)")
+  parser.add_argument("-d","--dir",default=".",
+                      help="output-directory (default: current directory)")
+  parser.add_argument("-f","--format",choices=["png","native"],default="png",
+                      help="png or native (palette-indices, one byte/pixel)")
+  parser.add_argument("-w","--workers",type=int,default=None,
+                      help="number of worker-processes (default: cpu-count)")
+  parser.add_argument("config",nargs="+",help="configuration-files")
+  return parser
+
+# --- main program   ----------------------------------------------------------
+
+if __name__ == '__main__':
+  args = get_parser().parse_args()
+  locale.setlocale(locale.LC_ALL, '')
+
+  times = args.time or [datetime.datetime.now()]
+  ext   = "png" if args.format == "png" else "bin"
+  jobs  = []
+  for config in args.config:
+    name = os.path.splitext(os.path.basename(config))[0]
+    for t in times:
+      jobs.append({
+        "config": config,
+        "now":    t,
+        "format": args.format,
+        "output": os.path.join(args.dir,"%s-%s.%s" % (
+                                         name,t.strftime("%Y%m%d-%H%M"),ext))
+        })
+
+  fetch_shared(jobs)
+  os.makedirs(args.dir,exist_ok=True)
+  rc = 0
+  with ProcessPoolExecutor(max_workers=args.workers) as executor:
+    for job,future in [(job,executor.submit(render_frame,job))
+                                                            for job in jobs]:
+      try:
+        output, frame_rc = future.result()
+        print("%s: %d" % (output,frame_rc))
+        if frame_rc not in [DailyAgenda.RC_OK,DailyAgenda.RC_UNCHANGED]:
+          rc = DailyAgenda.RC_FAIL
+      except Exception:
+        traceback.print_exc()
+        print("%s: failed" % job["output"])
+        rc = DailyAgenda.RC_FAIL
+  sys.exit(rc)
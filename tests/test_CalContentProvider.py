@@ -0,0 +1,317 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# pi-e-ink-daily: daily agenda on a wHat e-ink display
+#
+# Tests of the event-store of the calendar-provider (incremental
+# synchronization) using the local CalDAV stand-in tools/caldav_stub.py.
+#
+# Run: python3 -m unittest discover tests
+#
+# Author: Bernhard Bablok
+# License: GPL3
+#
+# Website: https://github.com/bablokb/pi-e-ink-daily
+#
+# ----------------------------------------------------------------------------
+
+import os, sys, json, time, heapq, shutil, tempfile, datetime, unittest
+import subprocess
+from types import SimpleNamespace
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0,os.path.join(ROOT,"tools"))
+sys.path.insert(0,os.path.join(ROOT,"files","usr","local","bin"))
+
+import caldav, requests
+
+from caldav_stub        import start_server
+from CalContentProvider import CalContentProvider
+from CalSync            import CalSync
+from Timing             import PhaseTimer
+
+# --- minimal screen used by the provider   ----------------------------------
+
+class Screen(object):
+
+  def __init__(self,cache_dir):
+    self.cache_dir = cache_dir
+    self.timer     = PhaseTimer()
+    self.session   = requests.Session()
+    self.offline   = {}                  # url -> time until available
+
+  def now(self):
+    return datetime.datetime.combine(datetime.date.today(),
+                                     datetime.time(0,0,1))
+
+  def get_cache_path(self,name):
+    return os.path.join(self.cache_dir,name)
+
+  def get_http_session(self):
+    return self.session
+
+  def wait_host(self,url):
+    if url in self.offline:
+      time.sleep(self.offline[url])      # like a probe which gives up
+      return False
+    return True
+
+# ----------------------------------------------------------------------------
+
+class TestEventStore(unittest.TestCase):
+
+  # --- setup and teardown   -------------------------------------------------
+
+  def setUp(self):
+    self.dir = tempfile.mkdtemp()
+    for name in ["work","home"]:
+      os.makedirs(os.path.join(self.dir,"cals",name))
+    self.write("work","a","alpha",10)
+    self.write("work","b","beta",12)
+    self.write("home","c","gamma",18)
+    self.server = start_server(os.path.join(self.dir,"cals"))
+
+  def tearDown(self):
+    self.server.shutdown()
+    self.server.server_close()
+    shutil.rmtree(self.dir)
+
+  # --- helpers   ------------------------------------------------------------
+
+  def write(self,cal,name,summary,hour):
+    """ write event of today """
+
+    today = datetime.date.today().strftime("%Y%m%d")
+    lines = ["BEGIN:VCALENDAR","VERSION:2.0","PRODID:-//test//EN",
+             "BEGIN:VEVENT","UID:%s@test" % name,
+             "DTSTAMP:%sT000000Z" % today,
+             "DTSTART:%sT%02d0000" % (today,hour),
+             "DTEND:%sT%02d3000" % (today,hour),
+             "SUMMARY:%s" % summary,"END:VEVENT","END:VCALENDAR",""]
+    with open(os.path.join(self.dir,"cals",cal,name+".ics"),"w") as f:
+      f.write("\r\n".join(lines))
+
+  def remove(self,cal,name):
+    os.unlink(os.path.join(self.dir,"cals",cal,name+".ics"))
+
+  def create_provider(self,cals,timeout=10):
+    """ create provider for the given calendars of the server """
+
+    provider = CalContentProvider(Screen(os.path.join(self.dir,"cache")))
+    provider.set_options(SimpleNamespace(
+      cal_threads=2, cal_timeout=timeout, cal_expand="server", cal_days=0,
+      data_max_age=86400, probe_deadline=5,
+      cals=[{"dav_url": "http://localhost:%d/" % self.server.server_port,
+             "dav_user": "user", "dav_pw": "pw", "cal_name": name,
+             "cal_color": "black"} for name in cals]))
+    return provider
+
+  def get_summaries(self,provider):
+    """ read agenda, return sorted summaries """
+
+    return sorted(entry[5] for stream in provider._get_agenda()
+                                                     for entry in stream)
+
+  def read_agenda(self,provider):
+    """ read agenda, return (summaries,calls) with the mocks of the
+        requests of the synchronization (sync,multiget,full) """
+
+    def spy(cls,name):
+      return mock.patch.object(cls,name,autospec=True,
+                               side_effect=getattr(cls,name))
+
+    with spy(CalSync,"sync_collection") as sync, \
+         spy(CalSync,"multiget") as multiget, \
+         spy(caldav.Calendar,"date_search") as full:
+      summaries = self.get_summaries(provider)
+    return (summaries,SimpleNamespace(sync=sync,multiget=multiget,full=full))
+
+  # --- tests   --------------------------------------------------------------
+
+  def test_unchanged(self):
+    """ unchanged calendar: no synchronization """
+
+    self.assertEqual(self.get_summaries(self.create_provider(["work"])),
+                     ["alpha","beta"])
+    summaries, calls = self.read_agenda(self.create_provider(["work"]))
+    self.assertEqual(summaries,["alpha","beta"])
+    calls.sync.assert_not_called()
+    calls.full.assert_not_called()
+
+  def test_changed_and_removed(self):
+    """ only changed resources are downloaded, removed ones are dropped """
+
+    self.get_summaries(self.create_provider(["work"]))
+    self.write("work","b","beta-2",13)
+    self.write("work","d","delta",15)
+    self.remove("work","a")
+
+    summaries, calls = self.read_agenda(self.create_provider(["work"]))
+    self.assertEqual(summaries,["beta-2","delta"])
+    self.assertEqual(calls.sync.call_count,1)
+    self.assertEqual(sorted(os.path.basename(href)
+                            for href in calls.multiget.call_args[0][1]),
+                     ["b.ics","d.ics"])
+    calls.full.assert_not_called()
+
+  def test_invalid_token(self):
+    """ invalid sync-token: full download """
+
+    provider = self.create_provider(["work"])
+    self.get_summaries(provider)
+    for stored in provider._store.values():
+      stored["token"] = "http://localhost/sync/work/unknown"
+    provider._save_event_store(provider._store)
+    self.write("work","a","alpha-2",11)
+
+    summaries, calls = self.read_agenda(self.create_provider(["work"]))
+    self.assertEqual(summaries,["alpha-2","beta"])
+    self.assertEqual(calls.sync.call_count,1)
+    calls.multiget.assert_not_called()
+    self.assertEqual(calls.full.call_count,1)
+
+  def test_shared_store(self):
+    """ providers with different calendars keep each other's entries """
+
+    self.get_summaries(self.create_provider(["work"]))
+    self.get_summaries(self.create_provider(["home"]))
+    self.get_summaries(self.create_provider(["work"]))
+
+    summaries, calls = self.read_agenda(self.create_provider(["home"]))
+    self.assertEqual(summaries,["gamma"])
+    calls.sync.assert_not_called()
+    calls.full.assert_not_called()
+
+  def test_abandoned_worker(self):
+    """ workers after the timeout don't change the caches """
+
+    provider  = self.create_provider(["work","home"],timeout=0.5)
+    get_state = provider._get_state
+    def slow_state(client,cal_info):
+      if cal_info["cal_name"] == "home":
+        time.sleep(1.5)
+      return get_state(client,cal_info)
+
+    with mock.patch.object(provider,"_get_state",side_effect=slow_state):
+      self.assertEqual(self.get_summaries(provider),["alpha","beta"])
+      time.sleep(2)                          # abandoned worker finishes
+
+    with open(os.path.join(self.dir,"cache",
+                           CalContentProvider.EVENT_STORE),"r") as f:
+      self.assertEqual([k.split("|")[-1] for k in json.load(f)],["work"])
+    self.assertEqual([k.split("|")[-1] for k in provider._store],["work"])
+
+  def test_unreachable_host(self):
+    """ calendars of available hosts don't wait for unavailable hosts """
+
+    provider = self.create_provider(["work"],timeout=1)
+    lost     = "http://localhost:1/"
+    provider.opts.cals.append(dict(provider.opts.cals[0],dav_url=lost))
+    provider.screen.offline[lost] = 2
+
+    done  = {}
+    start = time.monotonic()
+    sync_events = provider._sync_events
+    def timed_sync(client,cal_info,*args):
+      result = sync_events(client,cal_info,*args)
+      done[cal_info["dav_url"]] = time.monotonic() - start
+      return result
+
+    with mock.patch.object(provider,"_sync_events",side_effect=timed_sync):
+      self.assertEqual(self.get_summaries(provider),["alpha","beta"])
+    self.assertEqual(list(done),[provider.opts.cals[0]["dav_url"]])
+    self.assertLess(done[provider.opts.cals[0]["dav_url"]],1)
+    self.assertLess(time.monotonic()-start,2+1)
+
+  def test_exit_with_hanging_worker(self):
+    """ a hanging worker does not delay the exit of the program """
+
+    code = """
+import sys, time
+sys.path.insert(0,%r)
+from test_CalContentProvider import *
+provider = CalContentProvider(Screen(%r))
+provider.set_options(SimpleNamespace(
+  cal_threads=1, cal_timeout=0.5, cal_expand="server", cal_days=0,
+  data_max_age=86400, probe_deadline=0,
+  cals=[{"dav_url": "http://localhost:1/", "dav_user": "user",
+         "dav_pw": "pw", "cal_name": "hang", "cal_color": "black"}]))
+provider._get_state = lambda client,cal_info: time.sleep(60)
+try:
+  provider._get_agenda()
+except RuntimeError:
+  print("failed")
+""" % (os.path.dirname(os.path.abspath(__file__)),
+       os.path.join(self.dir,"cache"))
+
+    start = time.monotonic()
+    proc  = subprocess.run([sys.executable,"-c",code],timeout=30,
+                           stdout=subprocess.PIPE,universal_newlines=True)
+    self.assertEqual(proc.stdout.strip(),"failed")
+    self.assertLess(time.monotonic()-start,10)
+
+# ----------------------------------------------------------------------------
+
+class TestNextChange(unittest.TestCase):
+
+  def test_complete_agenda(self):
+    """ the next change considers all events, not only the visible ones """
+
+    day      = datetime.date.today()
+    ts       = lambda h,m=0: datetime.datetime.combine(
+                                      day,datetime.time(h,m)).timestamp()
+    screen   = SimpleNamespace(now=lambda: datetime.datetime.combine(
+                                                   day,datetime.time(8,0)))
+    provider = CalContentProvider(screen)
+    self.assertIsNone(provider.get_next_change())
+
+    provider.set_data({'day': day.isoformat(), 'days': 0, 'events': [
+      [[ts(7),ts(18),False,0,"black","running",""]],
+      [[ts(6),ts(7),False,1,"black","ended",""],
+       [ts(12),ts(13),False,1,"black","later",""]]]})
+    self.assertEqual(provider.get_next_change(),
+                     datetime.datetime.combine(day,datetime.time(12,0)))
+
+    provider.set_data({'day': day.isoformat(), 'days': 0, 'events': [
+      [[ts(6),ts(7),False,0,"black","ended",""]]]})
+    self.assertIsNone(provider.get_next_change())
+
+# ----------------------------------------------------------------------------
+
+class TestOverflow(unittest.TestCase):
+
+  def test_more(self):
+    """ the merge stops when the region is full, ended entries are no
+        part of the overflow-count """
+
+    day      = datetime.date.today()
+    ts       = lambda h,m=0: datetime.datetime.combine(
+                                      day,datetime.time(h,m)).timestamp()
+    screen   = SimpleNamespace(now=lambda: datetime.datetime.combine(
+                                                   day,datetime.time(8,15)))
+    provider = CalContentProvider(screen)
+    provider.set_options(SimpleNamespace(HEIGHT_E=10,HEIGHT_S=5))
+    provider.set_region((0,0,100,35))                  # 3 entries + more
+
+    streams = [[[ts(h),ts(h,30),False,0,"black","e%d" % h,""]
+                                                      for h in range(1,11)],
+               [[ts(h),ts(h,30),False,1,"black","e%d" % h,""]
+                                                     for h in range(11,16)]]
+    now      = screen.now().timestamp()
+    consumed = []
+    def entries():
+      for entry in heapq.merge(*streams):
+        consumed.append(entry)
+        if entry[1] > now:
+          yield entry
+
+    visible, more = provider._get_visible(
+                            entries(),provider._count_current(streams,now))
+
+    self.assertEqual([event.summary for event,_ in visible],["e8","e9","e10"])
+    self.assertEqual(more,5)                           # e11 to e15
+    self.assertEqual(len(consumed),7+4)        # ended and visible + 1
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,179 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# pi-e-ink-daily: daily agenda on a wHat e-ink display
+#
+# Tests of the local expansion of recurring events (CalRecurrence).
+#
+# Run: python3 -m unittest discover tests
+#
+# Author: Bernhard Bablok
+# License: GPL3
+#
+# Website: https://github.com/bablokb/pi-e-ink-daily
+#
+# ----------------------------------------------------------------------------
+
+import os, sys, json, datetime, unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0,os.path.join(ROOT,"files","usr","local","bin"))
+
+from dateutil import tz
+
+from CalRecurrence import CalRecurrence
+
+BERLIN = tz.gettz("Europe/Berlin")
+UTC    = datetime.timezone.utc
+
+VTIMEZONE = """BEGIN:VTIMEZONE
+TZID:Europe/Berlin
+BEGIN:STANDARD
+DTSTART:19701025T030000
+RRULE:FREQ=YEARLY;BYMONTH=10;BYDAY=-1SU
+TZOFFSETFROM:+0200
+TZOFFSETTO:+0100
+END:STANDARD
+BEGIN:DAYLIGHT
+DTSTART:19700329T020000
+RRULE:FREQ=YEARLY;BYMONTH=3;BYDAY=-1SU
+TZOFFSETFROM:+0100
+TZOFFSETTO:+0200
+END:DAYLIGHT
+END:VTIMEZONE"""
+
+# --- helpers   --------------------------------------------------------------
+
+def ical(*events,vtimezone=True):
+  """ return ical-object with the given VEVENTs """
+
+  lines = ["BEGIN:VCALENDAR","VERSION:2.0","PRODID:-//test//EN"]
+  if vtimezone:
+    lines.append(VTIMEZONE)
+  lines.extend(events)
+  lines.append("END:VCALENDAR")
+  return "\r\n".join("\r\n".join(lines).splitlines()) + "\r\n"
+
+def expand(data,start,end,tzinfo=BERLIN):
+  """ compile (json round-trip) and expand for the days start to end """
+
+  records = json.loads(json.dumps(CalRecurrence.compile(data)))
+  return sorted(CalRecurrence(records).expand(
+    datetime.datetime.combine(start,datetime.time.min,tzinfo=tzinfo),
+    datetime.datetime.combine(end,datetime.time.max,tzinfo=tzinfo)),
+    key=lambda item: item[0])
+
+D = datetime.date
+
+# ----------------------------------------------------------------------------
+
+class TestCalRecurrence(unittest.TestCase):
+
+  def test_tzid_dst(self):
+    """ wall-clock time of a TZID-event is kept across the DST-change
+        (with and without VTIMEZONE) """
+
+    for vtimezone in [True,False]:
+      with self.subTest(vtimezone=vtimezone):
+        items = expand(ical("""BEGIN:VEVENT
+UID:dst
+DTSTART;TZID=Europe/Berlin:20260326T090000
+DTEND;TZID=Europe/Berlin:20260326T093000
+RRULE:FREQ=DAILY
+SUMMARY:daily
+END:VEVENT""",vtimezone=vtimezone),D(2026,3,27),D(2026,3,31))
+
+        self.assertEqual([i[0].astimezone(BERLIN).strftime("%d %H:%M")
+                                                           for i in items],
+                    ["27 09:00","28 09:00","29 09:00","30 09:00","31 09:00"])
+        self.assertEqual([i[0].astimezone(UTC).hour for i in items],
+                         [8,8,7,7,7])
+        self.assertTrue(all(i[1]-i[0] == datetime.timedelta(minutes=30)
+                                                            for i in items))
+
+  def test_until_utc(self):
+    """ UNTIL in UTC is converted to the wall-clock of the event """
+
+    event = """BEGIN:VEVENT
+UID:until
+DTSTART;TZID=Europe/Berlin:20260401T220000
+DURATION:PT1H
+RRULE:FREQ=DAILY;UNTIL={0}
+SUMMARY:until
+END:VEVENT"""
+
+    # 20:00Z is 22:00 (CEST): the last instance is included
+    items = expand(ical(event.format("20260403T200000Z")),
+                   D(2026,3,30),D(2026,4,10))
+    self.assertEqual([i[0].day for i in items],[1,2,3])
+
+    items = expand(ical(event.format("20260403T195959Z")),
+                   D(2026,3,30),D(2026,4,10))
+    self.assertEqual([i[0].day for i in items],[1,2])
+
+  def test_exdate(self):
+    """ excluded instances are not expanded """
+
+    items = expand(ical("""BEGIN:VEVENT
+UID:exdate
+DTSTART;TZID=Europe/Berlin:20260501T100000
+DTEND;TZID=Europe/Berlin:20260501T110000
+RRULE:FREQ=DAILY;COUNT=10
+EXDATE;TZID=Europe/Berlin:20260503T100000,20260504T100000
+SUMMARY:exdate
+END:VEVENT"""),D(2026,5,1),D(2026,5,5))
+
+    self.assertEqual([i[0].day for i in items],[1,2,5])
+
+  def test_recurrence_id(self):
+    """ moved instances replace the original, cancelled ones are removed """
+
+    items = expand(ical("""BEGIN:VEVENT
+UID:series
+DTSTART;TZID=Europe/Berlin:20260501T210000
+DTEND;TZID=Europe/Berlin:20260501T220000
+RRULE:FREQ=DAILY
+SUMMARY:series
+END:VEVENT
+BEGIN:VEVENT
+UID:series
+RECURRENCE-ID;TZID=Europe/Berlin:20260503T210000
+DTSTART;TZID=Europe/Berlin:20260503T233000
+DTEND;TZID=Europe/Berlin:20260503T234500
+SUMMARY:moved
+END:VEVENT
+BEGIN:VEVENT
+UID:series
+RECURRENCE-ID;TZID=Europe/Berlin:20260504T210000
+DTSTART;TZID=Europe/Berlin:20260504T210000
+DTEND;TZID=Europe/Berlin:20260504T220000
+STATUS:CANCELLED
+SUMMARY:cancelled
+END:VEVENT"""),D(2026,5,2),D(2026,5,5))
+
+    self.assertEqual([(i[0].astimezone(BERLIN).strftime("%d %H:%M"),i[3])
+                                                           for i in items],
+                     [("02 21:00","series"),("03 23:30","moved"),
+                      ("05 21:00","series")])
+
+  def test_yearly_all_day(self):
+    """ yearly all-day events (e.g. birthdays) """
+
+    local = tz.tzlocal()
+    items = expand(ical("""BEGIN:VEVENT
+UID:birthday
+DTSTART;VALUE=DATE:19800615
+DTEND;VALUE=DATE:19800616
+RRULE:FREQ=YEARLY
+SUMMARY:birthday
+END:VEVENT""",vtimezone=False),D(2026,6,14),D(2026,6,16),tzinfo=local)
+
+    self.assertEqual(len(items),1)
+    start, end, all_day, summary, _ = items[0]
+    self.assertTrue(all_day)
+    self.assertEqual(summary,"birthday")
+    self.assertEqual(start.replace(tzinfo=None),datetime.datetime(2026,6,15))
+    self.assertEqual(end.replace(tzinfo=None),datetime.datetime(2026,6,16))
+
+if __name__ == '__main__':
+  unittest.main()
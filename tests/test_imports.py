@@ -0,0 +1,80 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# pi-e-ink-daily: daily agenda on a wHat e-ink display
+#
+# Tests of the import-time of the headless path (fresh processes, no
+# network access).
+#
+# Run: python3 -m unittest discover tests
+#
+# Author: Bernhard Bablok
+# License: GPL3
+#
+# Website: https://github.com/bablokb/pi-e-ink-daily
+#
+# ----------------------------------------------------------------------------
+
+import os, sys, json, subprocess, unittest
+
+ROOT    = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BIN_DIR = os.path.join(ROOT,"files","usr","local","bin")
+
+BUDGET_MS = 2000                 # see --import-budget in configuration.md
+
+# all modules of a headless update (without fetching data)
+HEADLESS = """
+import daily_agenda, CalContentProvider, WeatherContentProvider, requests
+daily_agenda.import_pil()
+CalContentProvider.import_caldav()
+"""
+
+# --- run python-code in a fresh process   -----------------------------------
+
+def run_python(code,*options):
+  """ run code, return (stdout,stderr) """
+
+  proc = subprocess.run([sys.executable] + list(options) + ["-c",code],
+                        cwd=BIN_DIR,stdout=subprocess.PIPE,
+                        stderr=subprocess.PIPE,universal_newlines=True)
+  if proc.returncode != 0:
+    raise RuntimeError(proc.stderr)
+  return (proc.stdout,proc.stderr)
+
+# ----------------------------------------------------------------------------
+
+class TestImports(unittest.TestCase):
+
+  def test_budget(self):
+    """ import-time of the headless path is within the budget """
+
+    _, stderr = run_python(HEADLESS,"-X","importtime")
+    modules = {}
+    for line in stderr.splitlines():
+      if line.startswith("import time:") and "[us]" not in line:
+        self_us, _, module = line[len("import time:"):].split("|")
+        modules[module.strip()] = int(self_us)
+
+    self.assertIn("PIL.Image",modules)
+    self.assertNotIn("inky",modules)             # headless: no display
+    import_ms = sum(modules.values())/1000
+    self.assertLess(import_ms,BUDGET_MS,
+                    "import-time %.1f ms exceeds budget of %.1f ms" %
+                    (import_ms,BUDGET_MS))
+
+  def test_module_imports_timed(self):
+    """ the import-hook is installed before the imports of the program """
+
+    stdout, _ = run_python("""
+import sys, json
+sys.argv[1:] = ["--import-budget","%d"]
+import daily_agenda
+from Timing import PhaseTimer
+print(json.dumps([i[0] for i in PhaseTimer.shared().imports["startup"]]))
+""" % BUDGET_MS)
+    modules = json.loads(stdout)
+    for module in ["ConfigCompiler","ContentProvider","Probe","RunLog"]:
+      self.assertIn(module,modules)
+
+if __name__ == '__main__':
+  unittest.main()
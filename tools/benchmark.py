@@ -0,0 +1,298 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# pi-e-ink-daily: offline end-to-end benchmark
+#
+# The benchmark starts a local CalDAV-server (tools/caldav_stub.py) and a
+# stub of the OWM one-call API, both serving fixed fixtures. It then runs
+# daily_agenda.py headless (no inky, no GPIOs) in a fresh process per run
+# and reports the wall-time of every phase as JSON.
+#
+# Fixtures:
+#   small:   one calendar with 3 events
+#   typical: two calendars with 12 events
+#   heavy:   five calendars with 200 events
+#
+# The events are generated (with a fixed seed) for the current day and all
+# of them end at midnight, so the number of rendered events does not depend
+# on the time of the run.
+#
+# Usage: tools/benchmark.py [-f fixture] [-n runs] [--warm] [-o file]
+#
+# Author: Bernhard Bablok
+# License: GPL3
+#
+# Website: https://github.com/bablokb/pi-e-ink-daily
+#
+# ----------------------------------------------------------------------------
+
+import argparse
+import os, sys, json, time, random, datetime, shutil, tempfile, platform
+import statistics, subprocess, threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+TOOLS_DIR = os.path.dirname(os.path.realpath(__file__))
+BIN_DIR   = os.path.join(TOOLS_DIR,"..","files","usr","local","bin")
+ETC_DIR   = os.path.join(TOOLS_DIR,"..","files","etc")
+
+FIXTURES = {
+  # name: (calendars, events)
+  'small':   (1,3),
+  'typical': (2,12),
+  'heavy':   (5,200)
+  }
+
+COLORS = ["white","gray","yellow","green","blue"]
+WORDS  = ["Meeting","Review","Lunch","Call","Dentist","Training","Team",
+          "Project","Planning","Sport","Doctor","School","Workshop","Dinner"]
+PLACES = ["","","Office","Room 42","Home","Downtown","Online"]
+
+# phases reported by the benchmark
+PHASES = ["total","config","imports","fonts","fetch","fetch_wait","parse",
+          "render","encode"]
+
+# counters of the caches (fonts and text-measurement) reported per run
+COUNTERS = ["font_loads","font_hits","measure_hits","measure_misses"]
+
+# --- create calendar-fixture   ----------------------------------------------
+
+def create_calendars(root,n_cals,n_events):
+  """ create ics-files for the current day (one directory per calendar) """
+
+  rnd   = random.Random(n_cals*1000+n_events)
+  today = datetime.date.today().strftime("%Y%m%d")
+  for c in range(n_cals):
+    os.makedirs(os.path.join(root,"cal%d" % c))
+  for e in range(n_events):
+    cal   = e % n_cals
+    start = rnd.randrange(0,23*60,15)
+    lines = ["BEGIN:VCALENDAR","VERSION:2.0",
+             "PRODID:-//pi-e-ink-daily//benchmark//EN",
+             "BEGIN:VEVENT",
+             "UID:bench-%d-%d@pi-e-ink-daily" % (cal,e),
+             "DTSTAMP:%sT000000Z" % today,
+             "DTSTART:%sT%02d%02d00" % (today,start//60,start%60),
+             "DTEND:%sT235900" % today,
+             "SUMMARY:%s %s" % (rnd.choice(WORDS),rnd.choice(WORDS))]
+    place = rnd.choice(PLACES)
+    if place:
+      lines.append("LOCATION:%s" % place)
+    lines += ["END:VEVENT","END:VCALENDAR",""]
+    with open(os.path.join(root,"cal%d" % cal,"event%03d.ics" % e),"w") as f:
+      f.write("\r\n".join(lines))
+  return ["cal%d" % c for c in range(n_cals)]
+
+# --- create weather-fixture   -----------------------------------------------
+
+def create_weather():
+  """ return response of the one-call API (metric units) """
+
+  rnd  = random.Random(42)
+  now  = int(time.time())
+  hour = now - now % 3600
+  def entry(dt,temp):
+    return {"dt": dt, "temp": temp, "pressure": rnd.randint(990,1030),
+            "humidity": rnd.randint(30,90),
+            "wind_speed": round(rnd.uniform(0,12),1),
+            "wind_deg": rnd.randint(0,359),
+            "weather": [{"id": rnd.choice([800,801,802,500,600]),
+                         "icon": rnd.choice(["01d","02d","03d","10d","13d"])}]}
+
+  current = entry(now,18.5)
+  current.update({"sunrise": hour-6*3600, "sunset": hour+6*3600})
+  hourly  = [entry(hour+i*3600,round(rnd.uniform(5,25),1)) for i in range(48)]
+  daily   = []
+  for i in range(8):
+    day = entry(hour+i*86400,None)
+    tmin = round(rnd.uniform(0,12),1)
+    day["temp"] = {"day": tmin+6, "min": tmin, "max": tmin+10}
+    day.update({"sunrise": hour+i*86400-6*3600, "sunset": hour+i*86400+6*3600})
+    daily.append(day)
+  return {"lat": 48.14, "lon": 11.58, "timezone": "Europe/Berlin",
+          "current": current, "hourly": hourly, "daily": daily}
+
+# --- stub of the OWM one-call API   -----------------------------------------
+
+class OWMHandler(BaseHTTPRequestHandler):
+  """ answer every GET with the weather-fixture """
+
+  def log_message(self,format,*args):
+    pass
+
+  def do_GET(self):
+    body = json.dumps(self.server.data).encode("utf-8")
+    self.send_response(200)
+    self.send_header("Content-Type","application/json; charset=utf-8")
+    self.send_header("Content-Length",str(len(body)))
+    self.send_header("Cache-Control","max-age=600")
+    self.end_headers()
+    self.wfile.write(body)
+
+def start_owm_server(data):
+  """ start OWM-stub in a thread, return server """
+
+  server = ThreadingHTTPServer(("localhost",0),OWMHandler)
+  server.daemon_threads = True
+  server.data = data
+  thread = threading.Thread(target=server.serve_forever,daemon=True)
+  thread.start()
+  return server
+
+# --- create configuration   -------------------------------------------------
+
+def create_config(path,cache_dir,cals,dav_port,owm_port):
+  """ write configuration-file for the benchmark """
+
+  dav_url = "http://localhost:%d/" % dav_port
+  config = {
+    "TITLE": "Benchmark",
+    "cache_dir": cache_dir,
+    "skip_unchanged": 0,
+    "owm_apikey": "benchmark",
+    "owm_url": "http://localhost:%d/data/2.5/onecall" % owm_port,
+    "layout": [
+      {"provider": "CalContentProvider",     "region": [0,0,60,100]},
+      {"provider": "WeatherContentProvider", "region": [60,0,40,100]}
+      ],
+    "cals": [{"dav_url": dav_url, "dav_user": "bench", "dav_pw": "bench",
+              "cal_name": cal, "cal_color": COLORS[i % len(COLORS)]}
+                                                for i,cal in enumerate(cals)]
+    }
+  with open(path,"w") as f:
+    json.dump(config,f,indent=2)
+
+# --- single run (executed in a fresh process)   -----------------------------
+
+def run_once(config,output):
+  """ render one frame, print timings as JSON """
+
+  start = time.monotonic()
+  sys.path.insert(0,os.path.realpath(BIN_DIR))
+  from Timing import PhaseTimer
+  timer = PhaseTimer.shared()
+  timer.start_import_timing()
+
+  import daily_agenda, ContentProvider
+  daily_agenda.CONFIG_FILE_DEFAULT = os.path.join(ETC_DIR,
+                                             "pi-e-ink-daily.defaults.json")
+  daily_agenda.CONFIG_FILE         = config
+  daily_agenda.SNAPSHOT_DIR        = os.path.join(os.path.dirname(config),
+                                                 "cache")
+  ContentProvider.ContentProvider.CONFIG_FILE_DEFAULT = os.path.join(
+                                  ETC_DIR,"pi-e-ink-daily.{}.defaults.json")
+
+  screen = daily_agenda.DailyAgenda(headless=True)
+  screen.update(output)
+  total = time.monotonic() - start
+  timer.stop_import_timing()
+
+  phases = timer.phases
+  fonts  = screen.fonts.get_stats()
+  sizes  = screen.measure.get_stats()
+  result = {
+    "total":          total,
+    "config":         phases.get("config",0.0),
+    "imports":        timer.get_import_time(),
+    "fonts":          fonts["load_time"],
+    "fetch":          phases.get("fetch-io",0.0),
+    "fetch_wait":     phases.get("fetch",0.0),
+    "parse":          phases.get("parse",0.0),
+    "render":         sum(phases.get(p,0.0)
+                                       for p in ["static","content","status"]),
+    "encode":         phases.get("show",0.0),
+    "font_loads":     fonts["loads"],
+    "font_hits":      fonts["hits"],
+    "measure_hits":   sizes["hits"],
+    "measure_misses": sizes["misses"],
+    "rc":             screen.rc
+    }
+  print(json.dumps(result))
+
+# --- run benchmark for a fixture   -----------------------------------------
+
+def run_fixture(name,work_dir,runs,warm):
+  """ run benchmark for a fixture, return dict with runs and medians """
+
+  n_cals, n_events = FIXTURES[name]
+  fix_dir   = os.path.join(work_dir,name)
+  cal_dir   = os.path.join(fix_dir,"calendars")
+  cache_dir = os.path.join(fix_dir,"cache")
+  config    = os.path.join(fix_dir,"pi-e-ink-daily.json")
+  output    = os.path.join(fix_dir,"frame.png")
+
+  # tools/caldav_stub.py is no module-name, so load it from its path
+  sys.path.insert(0,TOOLS_DIR)
+  from caldav_stub import start_server
+
+  cals = create_calendars(cal_dir,n_cals,n_events)
+  dav  = start_server(cal_dir)
+  owm  = start_owm_server(create_weather())
+  create_config(config,cache_dir,cals,dav.server_port,owm.server_port)
+
+  results = []
+  try:
+    for i in range(runs):
+      if not warm:
+        shutil.rmtree(cache_dir,ignore_errors=True)
+      os.makedirs(cache_dir,exist_ok=True)
+      proc = subprocess.run([sys.executable,os.path.realpath(__file__),
+                             "--run",config,output],
+                            stdout=subprocess.PIPE,universal_newlines=True)
+      if proc.returncode != 0:
+        raise RuntimeError("run %d of fixture %s failed" % (i,name))
+      results.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+  finally:
+    dav.shutdown()
+    owm.shutdown()
+
+  median = {p: statistics.median(r[p] for r in results)
+                                                    for p in PHASES+COUNTERS}
+  return {"calendars": n_cals, "events": n_events,
+          "median": median, "runs": results}
+
+# --- command-line parser   --------------------------------------------------
+
+def get_parser():
+  parser = argparse.ArgumentParser(description="offline benchmark")
+  parser.add_argument("-f","--fixture",choices=list(FIXTURES)+["all"],
+                      default="all",help="fixture to run (default: all)")
+  parser.add_argument("-n","--runs",type=int,default=5,
+                      help="number of runs per fixture (default: 5)")
+  parser.add_argument("--warm",action="store_true",
+                      help="keep the cache-directory between runs")
+  parser.add_argument("-o","--output",metavar="file",
+                      help="write results to file (default: stdout)")
+  parser.add_argument("--run",nargs=2,metavar=("config","frame"),
+                      help=argparse.SUPPRESS)
+  return parser
+
+# --- main program   ----------------------------------------------------------
+
+if __name__ == '__main__':
+  args = get_parser().parse_args()
+  if args.run:
+    run_once(*args.run)
+    sys.exit(0)
+
+  fixtures = list(FIXTURES) if args.fixture == "all" else [args.fixture]
+  work_dir = tempfile.mkdtemp(prefix="pi-e-ink-bench-")
+  try:
+    report = {
+      "time":     datetime.datetime.now().isoformat(timespec="seconds"),
+      "host":     platform.node(),
+      "machine":  platform.machine(),
+      "python":   platform.python_version(),
+      "runs":     args.runs,
+      "warm":     args.warm,
+      "unit":     "s",
+      "fixtures": {name: run_fixture(name,work_dir,args.runs,args.warm)
+                                                     for name in fixtures}
+      }
+  finally:
+    shutil.rmtree(work_dir,ignore_errors=True)
+
+  if args.output:
+    with open(args.output,"w") as f:
+      json.dump(report,f,indent=2)
+  else:
+    print(json.dumps(report,indent=2))
@@ -82,7 +82,8 @@ class ColorTester(object):
     self._font   = ImageFont.truetype(
       "/usr/share/fonts/truetype/dejavu/DejaVuSans-Oblique.ttf",50)
     self._text = "\u03C0"
-    self._text_size = self._canvas.textsize(self._text,self._font,spacing=0)
+    bbox = self._font.getbbox(self._text)   # textsize() is gone in Pillow 10
+    self._text_size = (bbox[2],bbox[3])
 
     # colors
     self._colors = [
@@ -0,0 +1,380 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# pi-e-ink-daily: minimal local stand-in for a CalDAV-server
+#
+# The server serves all *.ics files from the subdirectories of a given
+# directory (every subdirectory is a calendar). Changing, adding or removing
+# files changes the state of the calendar (ctag and sync-token).
+#
+# Supported: principal discovery, PROPFIND, GET, PUT, DELETE and the
+# REPORTs calendar-query (time-range, no expansion), calendar-multiget
+# and sync-collection (RFC 6578).
+#
+# Usage: tools/caldav_stub.py [-p port] directory
+#        dav_url for the configuration is http://localhost:port/
+#
+# Author: Bernhard Bablok
+# License: GPL3
+#
+# Website: https://github.com/bablokb/pi-e-ink-daily
+#
+# ----------------------------------------------------------------------------
+
+import argparse
+import os, re, hashlib, threading, datetime, calendar, time
+import xml.etree.ElementTree as ET
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, unquote
+from xml.sax.saxutils import escape
+
+D  = "DAV:"
+C  = "urn:ietf:params:xml:ns:caldav"
+CS = "http://calendarserver.org/ns/"
+
+PRINCIPAL = "/principal/"
+HOME      = "/calendars/"
+
+# ----------------------------------------------------------------------------
+# --- calendar-data of the server   ------------------------------------------
+
+class CalStore(object):
+  """ calendars backed by a directory """
+
+  def __init__(self,root):
+    self.root     = root
+    self._lock    = threading.Lock()
+    self._history = {}              # sync-token -> {href: etag}
+
+  # --- list calendars   -----------------------------------------------------
+
+  def calendars(self):
+    return sorted(d for d in os.listdir(self.root)
+                            if os.path.isdir(os.path.join(self.root,d)))
+
+  # --- state of a calendar   ------------------------------------------------
+
+  def objects(self,cal):
+    """ return dict href -> etag """
+
+    result = {}
+    cal_dir = os.path.join(self.root,cal)
+    for name in sorted(os.listdir(cal_dir)):
+      if name.endswith(".ics"):
+        with open(os.path.join(cal_dir,name),"rb") as f:
+          etag = '"%s"' % hashlib.md5(f.read()).hexdigest()
+        result["%s%s/%s" % (HOME,cal,name)] = etag
+    return result
+
+  def state(self,cal):
+    """ return (ctag,sync-token,objects) and remember state """
+
+    objects = self.objects(cal)
+    ctag = hashlib.md5(repr(sorted(objects.items())).encode()).hexdigest()
+    token = "http://localhost/sync/%s/%s" % (cal,ctag)
+    with self._lock:
+      self._history[token] = objects
+    return (ctag,token,objects)
+
+  def old_state(self,token):
+    with self._lock:
+      return self._history.get(token,None)
+
+  # --- access to single objects   -------------------------------------------
+
+  def path(self,href):
+    parts = href[len(HOME):].split("/")
+    return os.path.join(self.root,*parts)
+
+  def read(self,href):
+    try:
+      with open(self.path(href),"r") as f:
+        return f.read()
+    except Exception:
+      return None
+
+# ----------------------------------------------------------------------------
+# --- time-range handling   --------------------------------------------------
+
+def parse_ical_time(value):
+  """ parse DATE or DATE-TIME (UTC or local) and return epoch """
+
+  value = value.strip()
+  if len(value) == 8:
+    dt = datetime.datetime.strptime(value,"%Y%m%d")
+    return time.mktime(dt.timetuple())
+  elif value.endswith("Z"):
+    dt = datetime.datetime.strptime(value,"%Y%m%dT%H%M%SZ")
+    return calendar.timegm(dt.timetuple())
+  else:
+    dt = datetime.datetime.strptime(value,"%Y%m%dT%H%M%S")
+    return time.mktime(dt.timetuple())
+
+def in_range(data,start,end):
+  """ check if (non-recurring) event overlaps time-range """
+
+  m_start = re.search(r"^DTSTART[^:]*:(\S+)",data,re.M)
+  m_end   = re.search(r"^DTEND[^:]*:(\S+)",data,re.M)
+  if not m_start:
+    return False
+  ev_start = parse_ical_time(m_start.group(1))
+  ev_end   = parse_ical_time(m_end.group(1)) if m_end else ev_start
+  return ev_start < end and ev_end > start
+
+# ----------------------------------------------------------------------------
+# --- request-handler   ------------------------------------------------------
+
+class Handler(BaseHTTPRequestHandler):
+
+  protocol_version = "HTTP/1.1"
+
+  def log_message(self,format,*args):
+    if self.server.verbose:
+      super(Handler,self).log_message(format,*args)
+
+  # --- helpers   ------------------------------------------------------------
+
+  def _body(self):
+    length = int(self.headers.get("Content-Length",0))
+    return self.rfile.read(length) if length else b""
+
+  def _send(self,status,body="",ctype="application/xml; charset=utf-8",
+            headers={}):
+    data = body.encode("utf-8")
+    self.send_response(status)
+    self.send_header("Content-Type",ctype)
+    self.send_header("Content-Length",str(len(data)))
+    for key,value in headers.items():
+      self.send_header(key,value)
+    self.end_headers()
+    self.wfile.write(data)
+
+  def _multistatus(self,responses,extra=""):
+    body = ('<?xml version="1.0" encoding="utf-8"?>\n'
+            '<D:multistatus xmlns:D="DAV:" xmlns:C="%s" xmlns:CS="%s">\n'
+            '%s%s</D:multistatus>\n') % (C,CS,"".join(responses),extra)
+    self._send(207,body)
+
+  def _response(self,href,props,requested):
+    """ create response-element for the requested properties """
+
+    found   = []
+    missing = []
+    for tag in requested:
+      if tag in props:
+        found.append(props[tag])
+      else:
+        missing.append(tag)
+    result = "<D:response><D:href>%s</D:href>" % escape(href)
+    if found:
+      result += ("<D:propstat><D:prop>%s</D:prop>"
+                 "<D:status>HTTP/1.1 200 OK</D:status></D:propstat>"
+                                                          % "".join(found))
+    if missing:
+      result += ("<D:propstat><D:prop>%s</D:prop>"
+                 "<D:status>HTTP/1.1 404 Not Found</D:status></D:propstat>" %
+                 "".join('<X:%s xmlns:X="%s"/>' % (t[1],t[0])
+                                                      for t in missing))
+    return result + "</D:response>\n"
+
+  def _props(self,href):
+    """ return properties of resource as dict (ns,name) -> xml """
+
+    store = self.server.store
+    href_principal = "<D:href>%s</D:href>" % PRINCIPAL
+    props = {
+      (D,"current-user-principal"):
+        "<D:current-user-principal>%s</D:current-user-principal>" %
+                                                              href_principal,
+      (D,"principal-URL"):
+        "<D:principal-URL>%s</D:principal-URL>" % href_principal,
+      (C,"calendar-home-set"):
+        "<C:calendar-home-set><D:href>%s</D:href></C:calendar-home-set>" %
+                                                                        HOME
+      }
+    if href == HOME:
+      props[(D,"resourcetype")] = ("<D:resourcetype><D:collection/>"
+                                   "</D:resourcetype>")
+    elif href.startswith(HOME) and href.endswith("/"):
+      cal = href[len(HOME):-1]
+      ctag, token, _ = store.state(cal)
+      props[(D,"resourcetype")] = ("<D:resourcetype><D:collection/>"
+                                   "<C:calendar/></D:resourcetype>")
+      props[(D,"displayname")] = "<D:displayname>%s</D:displayname>" % cal
+      props[(CS,"getctag")]    = "<CS:getctag>%s</CS:getctag>" % ctag
+      props[(D,"sync-token")]  = "<D:sync-token>%s</D:sync-token>" % token
+      props[(C,"supported-calendar-component-set")] = (
+        '<C:supported-calendar-component-set><C:comp name="VEVENT"/>'
+        '</C:supported-calendar-component-set>')
+    elif href.startswith(HOME):
+      data = store.read(href)
+      if data is None:
+        return None
+      props[(D,"resourcetype")] = "<D:resourcetype/>"
+      props[(D,"getetag")] = "<D:getetag>%s</D:getetag>" % escape(
+                                    '"%s"' % hashlib.md5(
+                                      data.encode()).hexdigest())
+      props[(C,"calendar-data")] = ("<C:calendar-data>%s</C:calendar-data>" %
+                                                                 escape(data))
+    return props
+
+  def _requested(self,tree,default):
+    """ return list of requested properties """
+
+    prop = tree.find("{%s}prop" % D) if tree is not None else None
+    if prop is None:
+      return default
+    return [tuple(child.tag[1:].split("}")) for child in prop]
+
+  def _href(self):
+    path = unquote(urlparse(self.path).path)
+    if path in ["","/"]:
+      return "/"
+    return path
+
+  # --- PROPFIND   -----------------------------------------------------------
+
+  def do_PROPFIND(self):
+    body  = self._body()
+    tree  = ET.fromstring(body) if body else None
+    href  = self._href()
+    depth = self.headers.get("Depth","0")
+    store = self.server.store
+
+    props = self._props(href)
+    if props is None:
+      self._send(404)
+      return
+    requested = self._requested(tree,[t for t in props
+                                      if t != (C,"calendar-data")])
+    responses = [self._response(href,props,requested)]
+    if depth != "0":
+      if href == HOME:
+        children = ["%s%s/" % (HOME,cal) for cal in store.calendars()]
+      elif href.startswith(HOME) and href.endswith("/"):
+        children = list(store.objects(href[len(HOME):-1]))
+      else:
+        children = []
+      for child in children:
+        responses.append(self._response(child,self._props(child),requested))
+    self._multistatus(responses)
+
+  # --- REPORT   -------------------------------------------------------------
+
+  def do_REPORT(self):
+    tree  = ET.fromstring(self._body())
+    href  = self._href()
+    store = self.server.store
+    if not (href.startswith(HOME) and href.endswith("/")):
+      self._send(404)
+      return
+    cal = href[len(HOME):-1]
+    if cal not in store.calendars():
+      self._send(404)
+      return
+
+    requested = self._requested(tree,[(D,"getetag")])
+    requested = [r for r in requested if r in [(D,"getetag"),
+                                                (C,"calendar-data")]]
+    if tree.tag == "{%s}calendar-query" % C:
+      t_range = tree.find(".//{%s}time-range" % C)
+      hrefs   = list(store.objects(cal))
+      if t_range is not None:
+        start = parse_ical_time(t_range.get("start","19700101T000000Z"))
+        end   = parse_ical_time(t_range.get("end","20991231T000000Z"))
+        hrefs = [h for h in hrefs if in_range(store.read(h),start,end)]
+      self._multistatus([self._response(h,self._props(h),requested)
+                                                             for h in hrefs])
+    elif tree.tag == "{%s}calendar-multiget" % C:
+      responses = []
+      for elem in tree.findall("{%s}href" % D):
+        h = unquote(urlparse(elem.text.strip()).path)
+        props = self._props(h)
+        if props is None:
+          responses.append("<D:response><D:href>%s</D:href>"
+                           "<D:status>HTTP/1.1 404 Not Found</D:status>"
+                           "</D:response>\n" % escape(h))
+        else:
+          responses.append(self._response(h,props,requested))
+      self._multistatus(responses)
+    elif tree.tag == "{%s}sync-collection" % D:
+      token_elem = tree.find("{%s}sync-token" % D)
+      old_token = token_elem.text if token_elem is not None else None
+      _, token, objects = store.state(cal)
+      if old_token:
+        old = store.old_state(old_token)
+        if old is None:
+          self._send(403,'<?xml version="1.0" encoding="utf-8"?>\n'
+                     '<D:error xmlns:D="DAV:"><D:valid-sync-token/>'
+                     '</D:error>')
+          return
+      else:
+        old = {}
+      responses = []
+      for h,etag in objects.items():
+        if old.get(h,None) != etag:
+          responses.append(self._response(h,self._props(h),requested))
+      for h in old:
+        if h not in objects:
+          responses.append("<D:response><D:href>%s</D:href>"
+                           "<D:status>HTTP/1.1 404 Not Found</D:status>"
+                           "</D:response>\n" % escape(h))
+      self._multistatus(responses,
+                        "<D:sync-token>%s</D:sync-token>\n" % token)
+    else:
+      self._send(501)
+
+  # --- GET, PUT, DELETE   ---------------------------------------------------
+
+  def do_GET(self):
+    data = self.server.store.read(self._href())
+    if data is None:
+      self._send(404)
+    else:
+      self._send(200,data,ctype="text/calendar; charset=utf-8")
+
+  def do_PUT(self):
+    path = self.server.store.path(self._href())
+    with open(path,"wb") as f:
+      f.write(self._body())
+    self._send(201)
+
+  def do_DELETE(self):
+    try:
+      os.unlink(self.server.store.path(self._href()))
+      self._send(204)
+    except Exception:
+      self._send(404)
+
+# ----------------------------------------------------------------------------
+# --- start server in a background thread   ----------------------------------
+
+def start_server(root,port=0,verbose=False):
+  """ start server in a thread, return server (server.server_port is port) """
+
+  server = ThreadingHTTPServer(("localhost",port),Handler)
+  server.daemon_threads = True
+  server.store   = CalStore(root)
+  server.verbose = verbose
+  thread = threading.Thread(target=server.serve_forever,daemon=True)
+  thread.start()
+  return server
+
+# --- main program   ----------------------------------------------------------
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description="local CalDAV stand-in")
+  parser.add_argument("-p","--port",type=int,default=8008,
+                      help="port (default: 8008)")
+  parser.add_argument("directory",
+                      help="directory with one subdirectory per calendar")
+  args = parser.parse_args()
+
+  server = ThreadingHTTPServer(("localhost",args.port),Handler)
+  server.store   = CalStore(args.directory)
+  server.verbose = True
+  print("serving %s on http://localhost:%d/" % (args.directory,args.port))
+  try:
+    server.serve_forever()
+  except KeyboardInterrupt:
+    pass